@@ -1,88 +1,102 @@
 import torch
-import json
 import random
 from tqdm import tqdm
 from evotorch import Problem, SolutionBatch
 from evotorch.algorithms import GeneticAlgorithm
 from evotorch.operators import CrossOver, Operator
-from functools import partial
 import logging
 import argparse
 from line_profiler import LineProfiler
+from processed_items_io import load_processed_items
 
 profiler = LineProfiler()
 
 
 
-@profiler
-def check_unique_values(tensor):
-    
-    # Convert tensor to a list of values
-    values = tensor.tolist()
-    
-    # Dictionary to track indices of each value
-    value_indices = {}
-    
-    # Iterate over the specified range (TOTAL_NUM_ITEMS to TOTAL_NUM_ITEMS-1) to populate the dictionary
-    for idx in range(TOTAL_NUM_ITEMS, TOTAL_NUM_ITEMS-1):
-        value = values[idx]
-        if value in value_indices:
-            value_indices[value].append(idx)
-        else:
-            value_indices[value] = [idx]
-    
-    # Check for repeated values and print their indices
-    repeated_values = {value: indices for value, indices in value_indices.items() if len(indices) > 1}
-    
-    if repeated_values:
-        #print("The following values are repeated (within indices TOTAL_NUM_ITEMS to TOTAL_NUM_ITEMS-1):")
-        for value, indices in repeated_values.items():
-            #print(f"Value {value} repeats at indices: {indices}")
-            pass
-        return repeated_values
-
-    return None
-
 # Configure logging
 logging.getLogger("evotorch").setLevel(logging.WARNING)
 
-# Load JSON data
-with open('processed_items.json', 'r') as file:
-    processed_items = json.load(file)
+# Genome layout: one contiguous segment of cases[case] * NUM_TRADEUPS items per collection. Every gene is a row
+# of the shared item table and a segment only holds rows from its collection's range start..end-1. This replaces
+# the earlier genome of raw prices followed by floats, whose prices and floats are now gathered from the rows
+def get_case_segments(cases):
+    segments = []
+    start = 0
+    for case, num_items in cases.items():
+        count = num_items * NUM_TRADEUPS
+        segments.append((case, start, count))
+        start += count
+    return segments
+
+# Draw num_rows distinct rows of case_range for every individual of a (popsize, solution_length) tensor of item
+# rows, skipping the rows the individual already holds. Rows get random keys and the ones held are keyed below
+# every free row, so the top num_rows keys are a uniform sample without replacement of the free rows
+@profiler
+def sample_unique_rows(current_rows, case, case_range, num_rows):
+    start, end = case_range
+    present = torch.zeros(len(current_rows), end - start, dtype=torch.bool, device=current_rows.device)
+    individuals, positions = ((current_rows >= start) & (current_rows < end)).nonzero(as_tuple=True)
+    present[individuals, current_rows[individuals, positions] - start] = True
+
+    if len(current_rows) and (~present).sum(dim=1).min() < num_rows:
+        raise ValueError(f"Not enough unique items available in case {case}.")
+
+    keys = torch.rand(present.shape, device=current_rows.device).masked_fill(present, -1.0)
+    return keys.topk(num_rows, dim=1).indices + start
 
 # Define factory function for generating individuals
 @profiler
 def generate_individual(tradeup_data):
     cases = tradeup_data[0]['cases']
+    case_ranges = tradeup_data[1]
 
-    case_items = {case: [] for case in cases}
-
-    # Populate the case_items dictionary with items from each case
-    for case, items in tradeup_data[1].items():
-        if case in case_items:
-            case_items[case].extend(items)
+    # Sample the item rows of every collection segment in the order of the tradeup's cases
+    selected_rows = []
+    for case, _, count in get_case_segments(cases):
+        start, end = case_ranges.get(case, (0, 0))
+        if end - start < count:
+            raise ValueError(f"Not enough unique items in {case} to meet the requirement of {count}.")
+        selected_rows += random.sample(range(start, end), count)
 
-    # Get the first and second cases for base and modifier collections
-    case_keys = list(cases.keys())
-    base_case = case_keys[0]
-    modifier_case = case_keys[1]
+    return selected_rows
 
-    base_collection_count = cases[base_case] * NUM_TRADEUPS
-    modifier_collection_count = cases[modifier_case] * NUM_TRADEUPS
 
-    if len(case_items[base_case]) < base_collection_count:
-        raise ValueError(f"Not enough unique items in {base_case} to meet the requirement of {base_collection_count}.")
-    if len(case_items[modifier_case]) < modifier_collection_count:
-        raise ValueError(f"Not enough unique items in {modifier_case} to meet the requirement of {modifier_collection_count}.")
 
-    # Sample items for the base and modifier collections
-    base_collection = random.sample(case_items[base_case], base_collection_count)
-    modifier_collection = random.sample(case_items[modifier_case], modifier_collection_count)
-
-    selected_items = base_collection + modifier_collection
-
-    return selected_items
+# Replace every repeat of an item row within an individual, in place. Sorting the rows of the whole population
+# puts repeats next to each other, the first holder keeps the row and the others get rows the individual does
+# not hold yet. Rows of different collections never collide, so the replacements are drawn per segment
+@profiler
+def repair_duplicate_rows(values, segments, case_ranges):
+    sorted_rows, order = values.sort(dim=1, stable=True)
+    repeated = torch.zeros_like(values, dtype=torch.bool)
+    repeated.scatter_(1, order[:, 1:], sorted_rows[:, 1:] == sorted_rows[:, :-1])
+
+    for case, start, count in segments:
+        segment_repeated = repeated[:, start:start + count]
+        num_repeated = segment_repeated.sum(dim=1)
+        max_repeated = int(num_repeated.max()) if len(num_repeated) else 0
+        if max_repeated == 0:
+            continue
+
+        # The j-th repeat of an individual's segment takes the j-th of its new rows
+        individuals = (num_repeated > 0).nonzero(as_tuple=True)[0]
+        segment_repeated = segment_repeated[individuals]
+        new_rows = sample_unique_rows(values[individuals], case, case_ranges[case], max_repeated)
+        new_rows = new_rows.gather(1, (segment_repeated.cumsum(dim=1) - 1).clamp(min=0))
+        values[individuals, start:start + count] = torch.where(segment_repeated, new_rows, values[individuals, start:start + count])
+
+
+class DuplicateRepair(Operator):
+    # Runs after each variation operator so no individual is evaluated with the same listing twice
+    @profiler
+    def __init__(self, problem, tradeup_data):
+        super().__init__(problem)
+        self.case_ranges = tradeup_data[1]
+        self.segments = get_case_segments(tradeup_data[0]['cases'])
 
+    @profiler
+    def _do(self, solutions: SolutionBatch):
+        repair_duplicate_rows(solutions.access_values(), self.segments, self.case_ranges)
 
 
 class CustomMutation(Operator):
@@ -94,89 +108,26 @@ class CustomMutation(Operator):
 
         self.cases = tradeup_data[0]['cases']
         self.NUM_TRADEUPS = NUM_TRADEUPS
-        self.case_items = {case: [] for case in self.cases}
+        self.case_ranges = tradeup_data[1]
 
-        for case, items in tradeup_data[1].items():
-            if case in self.case_items:
-                self.case_items[case].extend(items)
-
-        case_keys = list(self.cases.keys())
-        self.base_case = case_keys[0]
-        self.modifier_case = case_keys[1]
-
-        self.base_collection_count = self.cases[self.base_case] * self.NUM_TRADEUPS
-        self.modifier_collection_count = self.cases[self.modifier_case] * self.NUM_TRADEUPS
+        self.segments = get_case_segments(self.cases)
 
     @profiler
     def _do(self, solutions: SolutionBatch):
         sln_values = solutions.access_values()
-        for i in range(len(sln_values)):
-            sln_values[i] = self._mutate_individual(sln_values[i])
-
-    @profiler
-    def _mutate_individual(self, individual):
-        mutated = individual.clone()
-        num_items = len(individual) // 2
-
-        # Create sets for current values
-        current_price_set = set(mutated[j].item() for j in range(num_items))
-        current_float_set = set(mutated[j + num_items].item() for j in range(num_items))
-
-        # Determine number of items to replace
-        base_num_to_replace = int(self.base_collection_count * self.mutation_rate)
-        modifier_num_to_replace = int(self.modifier_collection_count * self.mutation_rate)
-
-        if base_num_to_replace > 0:
-            self._replace_items(mutated, num_items, base_num_to_replace, self.base_case, current_price_set, current_float_set, range(self.base_collection_count))
-        
-        if modifier_num_to_replace > 0:
-            self._replace_items(mutated, num_items, modifier_num_to_replace, self.modifier_case, current_price_set, current_float_set, range(self.base_collection_count, self.base_collection_count + self.modifier_collection_count))
-
-        self._check_and_replace_repeated_values(mutated, current_price_set, current_float_set)
-
-        return mutated
-
-    @profiler
-    def _replace_items(self, mutated, num_items, num_to_replace, case, current_price_set, current_float_set, positions):
-        new_items = self._generate_unique_items(num_to_replace, current_price_set, current_float_set, case)
-        positions_to_replace = random.sample(positions, num_to_replace)
-        
-        for idx, pos in enumerate(positions_to_replace):
-            mutated[pos] = new_items[idx]['price']
-            mutated[pos + num_items] = new_items[idx]['floatvalue']
-
-    @profiler
-    def _check_and_replace_repeated_values(self, mutated, current_price_set, current_float_set):
-        repeated_values = check_unique_values(mutated)
-        if repeated_values:
-            for value, indices in repeated_values.items():
-                for index in indices:
-                    case = self.base_case if index < self.base_collection_count else self.modifier_case
-                    replacement_item = self._generate_unique_items(1, current_price_set, current_float_set, case)[0]
-                    
-                    mutated[index - TOTAL_NUM_ITEMS] = replacement_item['price']
-                    mutated[index] = replacement_item['floatvalue']
-                    
-                    current_price_set.add(replacement_item['price'])
-                    current_float_set.add(replacement_item['floatvalue'])
+        mutated = sln_values.clone()
+        popsize = len(mutated)
 
-    @profiler
-    def _generate_unique_items(self, num_items, current_price_set, current_float_set, case):
-        available_items = [item for item in self.case_items[case] if item['floatvalue'] not in current_float_set]
-        available_items_set = set(item['floatvalue'] for item in available_items)
-
-        if len(available_items) < num_items:
-            raise ValueError(f"Not enough unique items available for mutation in case {case}.")
+        # Replace a mutation_rate share of the items of every collection segment of the whole population. The
+        # positions are the lowest random keys of the segment and the new items are rows the individual does not hold yet
+        for case, start, count in self.segments:
+            num_to_replace = int(count * self.mutation_rate)
+            if num_to_replace > 0:
+                positions = torch.rand(popsize, count, device=mutated.device).argsort(dim=1)[:, :num_to_replace] + start
+                new_rows = sample_unique_rows(mutated, case, self.case_ranges[case], num_to_replace)
+                mutated.scatter_(1, positions, new_rows)
 
-        unique_items = []
-        while len(unique_items) < num_items:
-            item = random.choice(available_items)
-            if item['floatvalue'] not in current_float_set:
-                unique_items.append(item)
-                current_float_set.add(item['floatvalue'])
-                available_items.remove(item)
-
-        return unique_items
+        sln_values[:] = mutated
 
 
 
@@ -188,122 +139,93 @@ class CustomCrossOver(CrossOver):
         self.cross_over_rate = cross_over_rate
         self.cases = tradeup_data[0]['cases']
         self.NUM_TRADEUPS = NUM_TRADEUPS
-        self.base_case = list(self.cases.keys())[0]
-        self.modifier_case = list(self.cases.keys())[1]
-        self.base_collection_count = self.cases[self.base_case] * self.NUM_TRADEUPS
-        self.modifier_collection_count = self.cases[self.modifier_case] * self.NUM_TRADEUPS
+        self.segments = get_case_segments(self.cases)
+
+        # Number of parent pairs that were crossed over and that were passed on unchanged
+        self.success_count = torch.zeros((), dtype=torch.int64, device=problem.device)
+        self.failure_count = torch.zeros((), dtype=torch.int64, device=problem.device)
 
     @profiler
     def _do_cross_over(self, parents1: torch.Tensor, parents2: torch.Tensor) -> SolutionBatch:
         assert len(parents1) == len(parents2)
+        num_pairs = len(parents1)
 
-        childpop = SolutionBatch(self.problem, popsize=2*NUM_PARENTS, empty=True)
+        childpop = SolutionBatch(self.problem, popsize=2*num_pairs, empty=True)
         childpop_values = childpop.access_values()
 
-        for i in range(NUM_PARENTS):
-            #if random.random() < self.cross_over_rate: shelved
-                # Get unique items from base collections
-            base_items1 = set((parents1[i][j].item(), parents1[i][j + TOTAL_NUM_ITEMS].item()) for j in range(self.base_collection_count))
-            base_items2 = set((parents2[i][j].item(), parents2[i][j + TOTAL_NUM_ITEMS].item()) for j in range(self.base_collection_count))
-            unique_base_items = list(base_items1.union(base_items2))
-
-            if len(unique_base_items) > self.base_collection_count*1.25:
-
-                base_child1_items = unique_base_items[:self.base_collection_count]
-                base_child2_items = unique_base_items[-self.base_collection_count:]
-
-                # Get unique items from modifier collections
-                modifier_items1 = set((parents1[i][j].item(), parents1[i][j + TOTAL_NUM_ITEMS].item()) for j in range(TOTAL_NUM_ITEMS - self.modifier_collection_count, TOTAL_NUM_ITEMS))
-                modifier_items2 = set((parents2[i][j].item(), parents2[i][j + TOTAL_NUM_ITEMS].item()) for j in range(TOTAL_NUM_ITEMS - self.modifier_collection_count, TOTAL_NUM_ITEMS))
-                unique_modifier_items = list(modifier_items1.union(modifier_items2))
-
-                if len(unique_modifier_items) < self.modifier_collection_count:
-                    raise ValueError("Not enough unique items to create a crossover child from modifier collection.")
-
-                modifier_child1_items = unique_modifier_items[:self.modifier_collection_count]
-                modifier_child2_items = unique_modifier_items[-self.modifier_collection_count:]
-
-                # Combine base and modifier items
-                child1_items = base_child1_items + modifier_child1_items
-                child2_items = base_child2_items + modifier_child2_items
-
-                # Create child tensors
-                child1 = self._create_child_tensor(child1_items)
-                child2 = self._create_child_tensor(child2_items)
-
-                childpop_values[i*2] = child1
-                childpop_values[i*2 + 1] = child2
-                global crossover_success
-                crossover_success+=1
-            else:
-                childpop_values[i*2] = parents1[i]
-                childpop_values[i*2 + 1] = parents2[i]
-                global crossover_failure
-                crossover_failure+=1
+        #if random.random() < self.cross_over_rate: shelved
+        # Merge the item rows of every collection segment of both parents for all pairs at once
+        children1 = []
+        children2 = []
+        unique_counts = []
+        for _, start, count in self.segments:
+            children1_segment, children2_segment, unique_count = self._cross_over_segment(
+                parents1[:, start:start + count], parents2[:, start:start + count])
+            children1.append(children1_segment)
+            children2.append(children2_segment)
+            unique_counts.append(unique_count)
+
+        # The first (base) collection decides whether the parents differ enough to cross over
+        base_count = self.segments[0][2]
+        crossed = unique_counts[0] > base_count*1.25
+
+        for (case, _, count), unique_count in zip(self.segments, unique_counts):
+            if (crossed & (unique_count < count)).any():
+                raise ValueError(f"Not enough unique items to create a crossover child from collection {case}.")
+
+        crossed = crossed.unsqueeze(1)
+        childpop_values[0::2] = torch.where(crossed, torch.cat(children1, dim=1), parents1)
+        childpop_values[1::2] = torch.where(crossed, torch.cat(children2, dim=1), parents2)
+
+        num_crossed = crossed.sum()
+        self.success_count += num_crossed
+        self.failure_count += num_pairs - num_crossed
 
         return childpop
 
     @profiler
-    def _create_child_tensor(self, items):
-        child = torch.zeros(2*TOTAL_NUM_ITEMS, dtype=self.problem.dtype, device=self.problem.device)
-        
-        # Populate the child tensor
-        for i, (price, float_value) in enumerate(items):
-            if i >= TOTAL_NUM_ITEMS:
-                break
-            child[i] = price
-            child[i + TOTAL_NUM_ITEMS] = float_value
+    def _cross_over_segment(self, segment1, segment2):
+        # The union of the segment rows of both parents, in a random order, gives child 1 its first count rows
+        # and child 2 its last count rows. Returns both children's segments and the size of every union
+        num_pairs, count = segment1.shape
+        pool, _ = torch.cat([segment1, segment2], dim=1).sort(dim=1)
+        unique = torch.ones_like(pool, dtype=torch.bool)
+        unique[:, 1:] = pool[:, 1:] != pool[:, :-1]
+        unique_count = unique.sum(dim=1)
+
+        # Shuffle the unique rows to the front with random keys, the repeated ones are keyed behind them
+        keys = torch.rand(pool.shape, device=pool.device).masked_fill(~unique, -1.0)
+        pool = pool.gather(1, keys.argsort(dim=1, descending=True))
 
-        return child
+        last_positions = (unique_count.unsqueeze(1) - count + torch.arange(count, device=pool.device)).clamp(min=0)
+        return pool[:, :count], pool.gather(1, last_positions), unique_count
 
 
-# Define fitness function
+# Define fitness function over (popsize, TOTAL_NUM_ITEMS) tensors of the prices and floats gathered from the
+# item rows. Sums are taken in float64 like the Python sums main uses to pick the valid individuals
 @profiler
-def evaluate(individual, avg_float, tradeup_price):
-    num_items = len(individual) // 2
-    prices = individual[:num_items]
-    float_values = individual[num_items:]
-    
-    total_price = sum(prices)
-    total_float = sum(float_values)
-    avg_float_value = total_float / num_items
-    
-    price_deviation = total_price / TOTAL_NUM_ITEMS - tradeup_price
-    float_deviation = avg_float_value - avg_float
+def evaluate(prices, float_values, avg_float, tradeup_price):
+    prices = prices.to(torch.float64)
+    float_values = float_values.to(torch.float64)
+    num_items = float_values.shape[1]
+
+    price_deviation = prices.sum(dim=1) / TOTAL_NUM_ITEMS - tradeup_price
+    float_deviation = float_values.sum(dim=1) / num_items - avg_float
 
     # Penalty factors
     float_penalty_factor = 1000
     price_penalty_factor = 100
-    
-    fitness = 0
-    if price_deviation <= 0:
-        fitness += 20
-    else:
-        fitness -= price_deviation * price_penalty_factor
-    
-    if float_deviation <= 0:
-        fitness += 50
-    else:
-        fitness -= float_deviation * float_penalty_factor
-    #print(f'\n Fitness: {fitness}')
-    return fitness
-
-# Define a function to flatten a population
-@profiler
-def flatten_population(population):
-    flattened = []
-    for individual in population:
-        num_items = len(individual)
-        flattened.extend([item['price'] for item in individual] + [item['floatvalue'] for item in individual])
 
-    return flattened
+    price_fitness = torch.where(price_deviation <= 0, 20.0, -price_deviation * price_penalty_factor)
+    float_fitness = torch.where(float_deviation <= 0, 50.0, -float_deviation * float_penalty_factor)
+    return price_fitness + float_fitness
 
 # Define a custom problem class
 class CustomProblem(Problem):
     @profiler
-    def __init__(self, eval_func, solution_length, dtype, device, tradeup_data, avg_float, tradeup_price):
+    def __init__(self, solution_length, dtype, device, tradeup_data, avg_float, tradeup_price, item_prices, item_floats):
+        # No objective_func, _evaluate_batch scores the whole population
         super().__init__(
-            objective_func=eval_func,
             objective_sense="max",
             solution_length=solution_length,
             dtype=dtype,
@@ -312,6 +234,8 @@ class CustomProblem(Problem):
         self.tradeup_data = tradeup_data
         self.avg_float = avg_float
         self.tradeup_price = tradeup_price
+        self.item_prices = item_prices.to(self.device)
+        self.item_floats = item_floats.to(self.device)
     
     @profiler
     def _fill(self, values: torch.Tensor):
@@ -324,54 +248,63 @@ class CustomProblem(Problem):
         for i, individual in enumerate(initial_population):
             if len(individual) == 0:
                 continue
-            num_items = len(individual)
+            values[i, :len(individual)] = torch.tensor(individual, dtype=self.dtype, device=self.device)
 
-            prices = [item['price'] for item in individual]
-            float_values = [item['floatvalue'] for item in individual]
-            values[i, :num_items] = torch.tensor(prices, dtype=self.dtype, device=self.device)
-            values[i, num_items:num_items*2] = torch.tensor(float_values, dtype=self.dtype, device=self.device)
+    def gather_items(self, values):
+        # Prices and floats of (popsize, TOTAL_NUM_ITEMS) item rows
+        return self.item_prices[values], self.item_floats[values]
     
     @profiler
     def _evaluate_batch(self, solutions):
-        for i, solution in enumerate(solutions):
-            individual = solution.values.cpu().numpy()
-            fitness = evaluate(individual, self.avg_float, self.tradeup_price)
-            solution.set_evals(fitness)
+        prices, float_values = self.gather_items(solutions.values)
+        solutions.set_evals(evaluate(prices, float_values, self.avg_float, self.tradeup_price))
     
 
 @profiler
 def main(start_index, end_index):
-    with open('processed_items.json', 'r') as file:
-        processed_items = json.load(file)
+    items, tradeups = load_processed_items()
+
+    # Columns of the shared item table that the item rows of the genome index into. Prices and floats are kept
+    # in float32 like the genome used to store them
+    item_prices = torch.tensor(items['price'], dtype=torch.float32)
+    item_floats = torch.tensor(items['floatvalue'], dtype=torch.float32)
+    source_rows = items['source_row']
+
+    # Crossover stats summed over the tradeups
+    crossover_success = torch.zeros((), dtype=torch.int64)
+    crossover_failure = torch.zeros((), dtype=torch.int64)
 
-    tradeup_items = list(processed_items.items())[start_index:end_index]
+    tradeup_items = list(tradeups.items())[start_index:end_index]
     
     output_filename = f'best_individuals_{start_index}_to_{end_index}.txt'
 
-    for i, (tradeup_key, tradeup_data) in enumerate(tqdm(tradeup_items, desc=f'Processing Tradeups {start_index}-{end_index}')):
-        params = tradeup_data[0]
+    for i, (tradeup_key, (params, case_ranges)) in enumerate(tqdm(tradeup_items, desc=f'Processing Tradeups {start_index}-{end_index}')):
+        # The tradeup's item rows are the ranges of its cases in the shared item table
+        tradeup_data = [params, case_ranges]
         avg_float = params['avg_float']
         tradeup_price = params['tradeup_price']
 
-        eval_func = partial(evaluate, avg_float=avg_float, tradeup_price=tradeup_price)
-
-        solution_length = len(flatten_population([generate_individual(tradeup_data)]))
+        solution_length = len(generate_individual(tradeup_data))
         problem = CustomProblem(
-            eval_func=eval_func,
             solution_length=solution_length,
-            dtype=torch.float32,
+            dtype=torch.int64,
             device = "cpu",
             tradeup_data=tradeup_data,
             avg_float=avg_float,
-            tradeup_price=tradeup_price,      
+            tradeup_price=tradeup_price,
+            item_prices=item_prices,
+            item_floats=item_floats,
         )
 
+        crossover = CustomCrossOver(problem, tournament_size=2, cross_over_rate=0.85, tradeup_data=tradeup_data)
         ga = GeneticAlgorithm(
             problem,
             popsize=POP_SIZE,
             operators=[
-                CustomCrossOver(problem, tournament_size=2, cross_over_rate=0.85, tradeup_data=tradeup_data),
+                crossover,
+                DuplicateRepair(problem, tradeup_data=tradeup_data),
                 CustomMutation(problem, mutation_rate=0.2, tradeup_data=tradeup_data),
+                DuplicateRepair(problem, tradeup_data=tradeup_data),
             ],
             elitist=True
         )       
@@ -382,12 +315,18 @@ def main(start_index, end_index):
                 ga.step()
                 pbar.update(1)
 
-        # Get all individuals
-        all_individuals = ga.population.values.cpu().tolist()
+        crossover_success += crossover.success_count.cpu()
+        crossover_failure += crossover.failure_count.cpu()
+
+        # Get all individuals as their item rows and their prices followed by their floats
+        all_rows = ga.population.values.cpu()
+        all_prices, all_floats = problem.gather_items(all_rows)
+        all_individuals = torch.cat([all_prices, all_floats], dim=1).cpu().tolist()
+        all_rows = all_rows.tolist()
 
         valid_individuals = []
 
-        for individual in all_individuals:
+        for individual, rows in zip(all_individuals, all_rows):
             num_items = len(individual) // 2
             prices = individual[:num_items]
             float_values = individual[num_items:]
@@ -400,14 +339,15 @@ def main(start_index, end_index):
             float_deviation = avg_float_value - avg_float
 
             if price_deviation <= 0 and float_deviation <= 0:
-                valid_individuals.append((individual, price_deviation, float_deviation))
+                valid_individuals.append((individual, rows, price_deviation, float_deviation))
 
         # Write results to the range-specific file
         with open(output_filename, 'a') as file:
             if valid_individuals:
-                for valid_individual, price_dev, float_dev in valid_individuals:
+                for valid_individual, rows, price_dev, float_dev in valid_individuals:
                     file.write(f"Best Tradeup: {tradeup_key}\n")
                     file.write(f"Best Individual: {valid_individual}\n")
+                    file.write(f"Best Items: {[source_rows[row] for row in rows]}\n")
                     file.write(f"price_deviation: {price_dev:.4f}\n")
                     file.write(f"float_deviation: {float_dev:.4f}\n")
                     file.write("------\n")
@@ -426,6 +366,7 @@ def main(start_index, end_index):
 
                 file.write(f"Best Tradeup: {tradeup_key}\n")
                 file.write(f"Best Individual: {best_individual}\n")
+                file.write(f"Best Items: {[source_rows[row] for row in all_rows[0]]}\n")
                 file.write(f"price_deviation: {price_deviation:.4f}\n")
                 file.write(f"float_deviation: {float_deviation:.4f}\n")
                 file.write("------\n")
@@ -437,6 +378,8 @@ def main(start_index, end_index):
                 print(x)
             print('\n')
 
+    crossover_success = crossover_success.item()
+    crossover_failure = crossover_failure.item()
     print('after running:')
     print(f'crossover_success: {crossover_success}, crossover_failure: {crossover_failure}')
     print(f'crossover success rate: {(crossover_success/(crossover_success+crossover_failure))*100}%')
@@ -444,14 +387,10 @@ def main(start_index, end_index):
 
 if __name__ == "__main__":
 
-    crossover_success=0
-    crossover_failure=0
-
     NGENS = 400
     NUM_TRADEUPS= 1
     TOTAL_NUM_ITEMS = 10*NUM_TRADEUPS
     POP_SIZE = 200
-    NUM_PARENTS = POP_SIZE//2
 
     parser = argparse.ArgumentParser(description='Process a range of tradeups.')
     parser.add_argument('start', type=int, help='Start index of tradeups to process')
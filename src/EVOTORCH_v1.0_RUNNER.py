@@ -1,15 +1,14 @@
-import json
 import subprocess
 import math
+from processed_items_io import load_processed_items
 
 # Set the number of parallel processes
 PARALLELIZATION = 7
 
-# Read the processed_items.json file
-with open('processed_items.json', 'r') as file:
-    processed_items = json.load(file)
+# Read the tradeups of processed_items.json
+_, tradeups = load_processed_items()
 
-total_items = len(processed_items)
+total_items = len(tradeups)
 
 # Calculate the size of each chunk
 chunk_size = math.ceil(total_items / PARALLELIZATION)
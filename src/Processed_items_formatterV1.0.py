@@ -1,5 +1,6 @@
 import orjson
 from tqdm import tqdm
+from processed_items_io import load_processed_items
 
 def get_wear(float_value):
     if float_value < 0.07:
@@ -14,27 +15,26 @@ def get_wear(float_value):
         return "Battle-Scarred"
 
 def format_data(input_file, output_file, sample_output_file):
-    with open(input_file, 'rb') as f:
-        data = orjson.loads(f.read())
+    items, tradeups = load_processed_items(input_file)
 
     formatted_data = {}
     sample_formatted_data = {}
 
-    for idx, (key, value) in enumerate(tqdm(data.items(), desc="Processing items")):
+    for idx, (key, value) in enumerate(tqdm(tradeups.items(), desc="Processing items")):
         tradeup_info = value[0]
-        items_info = value[1]
+        case_ranges = value[1]
 
         formatted_items = []
 
-        for case, items in items_info.items():
-            for item in items:
-                wear = get_wear(item['floatvalue'])
+        for case, (start, end) in case_ranges.items():
+            for row in range(start, end):
+                wear = get_wear(items['floatvalue'][row])
                 formatted_item = [
-                    f"{item['name']} ({wear})",
+                    f"{items['name'][row]} ({wear})",
                     "steam://rungame/730/76561202255233023/+csgo_econ_action_preview%20placeholder",
                     case,
-                    str(item['price']),
-                    str(item['floatvalue']),
+                    str(items['price'][row]),
+                    str(items['floatvalue'][row]),
                     "placeholder",
                     "placeholder"
                 ]
@@ -1,7 +1,13 @@
 import csv
 import json
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
 from collections import defaultdict
+import numpy as np
 from tqdm import tqdm
+from market_price_index import MarketPriceIndex, WEAR_NAMES
 
 STEAM_TAX_THRESHOLD = 1.15
 
@@ -19,17 +25,6 @@ def read_skins_csv(filename):
             cases.add(row['Case'])
     return skins, list(cases)
 
-def read_market_data_csv(filename):
-    market_data = {}
-    with open(filename, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            market_data[row['hash_name']] = {
-                'sell_listings': int(row['sell_listings']),
-                'sell_price': float(row['sell_price'])
-            }
-    return market_data
-
 def calculate_output_float(avg_float, min_float, max_float):
     return (max_float - min_float) * avg_float + min_float
 
@@ -44,71 +39,177 @@ def get_wear_category(output_float):
     return next((wear for wear, (min_float, max_float) in wears.items() 
                  if min_float <= output_float < max_float), None)
 
-def get_cheapest_price(weapon_skin, wear, market_data):
-    for key, data in market_data.items():
-        if weapon_skin in key and wear in key:
-            return data['sell_price']
-    return None
+def get_case_outcomes(case, output_rarity, average_float, all_skins, price_index, outcome_cache):
+    # Output skins of a case as (name, wear, price) vectors, memoized per (case, output_rarity, avg_float)
+    # so they are shared by every other_case and num_other split
+    key = (case, output_rarity, average_float)
+    if key not in outcome_cache:
+        names, wears, prices = [], [], []
+        for skin in all_skins[case][output_rarity]:
+            output_float = calculate_output_float(average_float, skin['start_float'], skin['end_float'])
+            output_wear = get_wear_category(output_float)
+            output_price = price_index.get_price(skin['name'], output_wear)
+            names.append(skin['name'])
+            wears.append(output_wear)
+            prices.append(np.nan if output_price is None else output_price)
+        outcome_cache[key] = {'names': names, 'wears': wears, 'prices': np.array(prices, dtype=float)}
+    return outcome_cache[key]
+
+def combine_outcomes(outcomes_and_counts):
+    # Every outcome of a case is weighted by that case's input count; the weights are normalized over
+    # all (outcome, input) pairs, i.e. the same odds as listing each case's outcomes count times
+    names = [name for outcomes, _ in outcomes_and_counts for name in outcomes['names']]
+    wears = [wear for outcomes, _ in outcomes_and_counts for wear in outcomes['wears']]
+    prices = np.concatenate([outcomes['prices'] for outcomes, _ in outcomes_and_counts])
+    counts = np.concatenate([np.full(len(outcomes['names']), count) for outcomes, count in outcomes_and_counts])
+    weights = counts / counts.sum()
+    return names, wears, prices, weights
 
-def generate_tradeup_combinations(original_tradeup, all_skins, all_cases, market_data):
+def build_min_price_tables(all_skins, price_index):
+    # Cheapest listing per (case, rarity, wear): {(case, rarity): (min prices, skin names)}, each indexed like WEAR_NAMES
+    min_price_tables = {}
+    for case, rarities in all_skins.items():
+        for rarity, skins in rarities.items():
+            names = [skin['name'] for skin in skins]
+            price_table = price_index.price_table(names)
+            listed = ~np.isnan(price_table).all(axis=0)
+            min_prices = np.full(len(WEAR_NAMES), np.nan)
+            min_prices[listed] = np.nanmin(price_table[:, listed], axis=0)
+            cheapest = np.argmin(np.where(np.isnan(price_table), np.inf, price_table), axis=0)
+            min_price_tables[(case, rarity)] = (min_prices, [names[i] if ok else None for i, ok in zip(cheapest, listed)])
+    return min_price_tables
+
+def build_combination(original_tradeup, case_counts, case_outcomes, other_input_skins, total_input_cost, avg_output_price):
+    new_tradeup = original_tradeup.copy()
+    new_tradeup['Case'] = ' + '.join(f"{case} ({count})" for case, count in case_counts)
+    new_tradeup['Other Input Skin'] = other_input_skins
+    new_tradeup['Total Input Cost'] = float(total_input_cost)
+    
+    # Keep the average float the same
+    new_tradeup['Average Float'] = original_tradeup['Average Float']
+    
+    new_tradeup['Avg Output Price'] = float(avg_output_price)
+    profitability_before_tax = new_tradeup['Avg Output Price'] / new_tradeup['Total Input Cost']
+    new_tradeup['Real Profitablity'] = profitability_before_tax / STEAM_TAX_THRESHOLD
+    
+    # Calculate outputs_details with percentages. An output shared by several cases adds up their weights
+    names, wears, prices, weights = combine_outcomes([(outcomes, count) for outcomes, (_, count) in zip(case_outcomes, case_counts)])
+    output_prices = {}
+    output_weights = defaultdict(float)
+    for name, wear, price, weight in zip(names, wears, prices, weights):
+        output_prices[f"{name} ({wear})"] = float(price)
+        output_weights[f"{name} ({wear})"] += weight
+    new_tradeup['outputs_details'] = {
+        output: [output_prices[output], f"{weight:.2%}"]
+        for output, weight in output_weights.items()
+    }
+    return new_tradeup
+
+def generate_tradeup_combinations(original_tradeup, all_skins, all_cases, price_index, outcome_cache, min_price_tables):
     combinations = []
     original_case = original_tradeup['Case']
     original_rarity = original_tradeup['Input Rarity']
     input_wear = original_tradeup['Inputs Wear']
     output_rarity = original_tradeup['Output Rarity']
     average_float = original_tradeup['Average Float']
+    wear_index = WEAR_NAMES.index(input_wear)
     
-    other_cases = [case for case in all_cases if case != original_case]
-    
-    for other_case in other_cases:
-        for num_other in range(1, 6):  # 1 to 5 items from other case
-            num_original = 10 - num_other
-            new_tradeup = original_tradeup.copy()
-            new_tradeup['Case'] = f"{original_case} ({num_original}) + {other_case} ({num_other})"
-            
-            # Calculate input cost
-            original_cost = get_cheapest_price(original_tradeup['Input Skin'], input_wear, market_data) * num_original
-            other_cost = get_cheapest_price(all_skins[other_case][original_rarity][0]['name'], input_wear, market_data) * num_other
-            new_tradeup['Total Input Cost'] = original_cost + other_cost
-            
-            # Keep the average float the same
-            new_tradeup['Average Float'] = average_float
-            
-            # Calculate outputs
-            outputs = []
-            for case, count in [(original_case, num_original), (other_case, num_other)]:
-                case_outputs = []
-                for skin in all_skins[case][output_rarity]:
-                    output_float = calculate_output_float(average_float, skin['start_float'], skin['end_float'])
-                    output_wear = get_wear_category(output_float)
-                    output_price = get_cheapest_price(skin['name'], output_wear, market_data)
-                    case_outputs.append({'name': skin['name'], 'wear': output_wear, 'price': output_price})
-                outputs.extend(case_outputs * count)
-            
-            # Calculate average output price
-            total_price = sum(item['price'] for item in outputs)
-            avg_output_price = total_price / len(outputs)
-            
-            new_tradeup['Avg Output Price'] = avg_output_price
-            profitability_before_tax = avg_output_price / new_tradeup['Total Input Cost']
-            new_tradeup['Real Profitablity'] = profitability_before_tax / STEAM_TAX_THRESHOLD
-            
-            # Calculate outputs_details with percentages
-            output_counts = defaultdict(int)
-            for item in outputs:
-                output_counts[(item['name'], item['wear'])] += 1
-            
-            new_tradeup['outputs_details'] = {
-                f"{name} ({wear})": [price, f"{count/len(outputs):.2%}"]
-                for (name, wear), count in output_counts.items()
-                for item in outputs if item['name'] == name and item['wear'] == wear
-                for price in [item['price']]
-            }
-            
-            combinations.append(new_tradeup)
+    other_cases = [case for case in all_cases if case != original_case and all_skins[case][output_rarity]]
+    if not other_cases:
+        return combinations
+    original_outcomes = get_case_outcomes(original_case, output_rarity, average_float, all_skins, price_index, outcome_cache)
+    other_outcomes = [get_case_outcomes(case, output_rarity, average_float, all_skins, price_index, outcome_cache) for case in other_cases]
+
+    # Evaluate every (other_case, num_other) pair at once; the filler inputs are always the cheapest
+    # skin of the other case in the input rarity and wear
+    original_price = price_index.get_price(original_tradeup['Input Skin'], input_wear)
+    original_price = np.nan if original_price is None else original_price
+    filler_prices = np.array([min_price_tables[(case, original_rarity)][0][wear_index] if (case, original_rarity) in min_price_tables else np.nan
+                              for case in other_cases])
+    other_price_sums = np.array([outcomes['prices'].sum() for outcomes in other_outcomes])
+    other_output_counts = np.array([len(outcomes['names']) for outcomes in other_outcomes])
+
+    num_others = np.arange(1, 6)  # 1 to 5 items from other case
+    num_originals = 10 - num_others
+    total_input_costs = original_price * num_originals[None, :] + filler_prices[:, None] * num_others[None, :]
+    avg_output_prices = ((num_originals[None, :] * original_outcomes['prices'].sum() + num_others[None, :] * other_price_sums[:, None]) /
+                         (num_originals[None, :] * len(original_outcomes['names']) + num_others[None, :] * other_output_counts[:, None]))
+    valid = np.isfinite(total_input_costs) & np.isfinite(avg_output_prices)
+
+    for case_index, k in zip(*np.nonzero(valid)):
+        other_case = other_cases[case_index]
+        num_other, num_original = int(num_others[k]), int(num_originals[k])
+        combinations.append(build_combination(
+            original_tradeup, [(original_case, num_original), (other_case, num_other)],
+            [original_outcomes, other_outcomes[case_index]],
+            {other_case: min_price_tables[(other_case, original_rarity)][1][wear_index]},
+            total_input_costs[case_index, k], avg_output_prices[case_index, k]))
     
     return combinations
 
+def generate_multi_collection_combinations(original_tradeup, all_skins, all_cases, price_index, outcome_cache, min_price_tables,
+                                           max_collections, min_profitability):
+    # Mixes of 3 to max_collections collections, searched depth first with branch and bound. The average
+    # output price of a mix is a weighted mean of its collections' mean output prices, so a branch can at
+    # best reach the highest mean among the collections it has or may still add, at no less than its cost
+    # so far plus the cheapest remaining filler for every open slot. Branches whose bound on
+    # 'Real Profitablity' is below min_profitability are never expanded.
+    combinations = []
+    original_case = original_tradeup['Case']
+    original_rarity = original_tradeup['Input Rarity']
+    input_wear = original_tradeup['Inputs Wear']
+    output_rarity = original_tradeup['Output Rarity']
+    average_float = original_tradeup['Average Float']
+    wear_index = WEAR_NAMES.index(input_wear)
+
+    original_price = price_index.get_price(original_tradeup['Input Skin'], input_wear)
+    original_outcomes = get_case_outcomes(original_case, output_rarity, average_float, all_skins, price_index, outcome_cache)
+    if original_price is None or not np.isfinite(original_outcomes['prices'].sum()):
+        return combinations
+
+    others = []
+    for case in all_cases:
+        if case == original_case or not all_skins[case][output_rarity] or (case, original_rarity) not in min_price_tables:
+            continue
+        outcomes = get_case_outcomes(case, output_rarity, average_float, all_skins, price_index, outcome_cache)
+        filler_price = min_price_tables[(case, original_rarity)][0][wear_index]
+        if np.isfinite(outcomes['prices'].sum()) and np.isfinite(filler_price):
+            others.append((case, outcomes, filler_price, min_price_tables[(case, original_rarity)][1][wear_index]))
+
+    # Visiting the best collections first tightens the bound early
+    others.sort(key=lambda other: other[1]['prices'].mean(), reverse=True)
+    suffix_max_means = np.maximum.accumulate([other[1]['prices'].mean() for other in others][::-1])[::-1]
+    suffix_min_fillers = np.minimum.accumulate([other[2] for other in others][::-1])[::-1]
+
+    def search(next_index, remaining, chosen, price_sum, output_count, cost):
+        if remaining == 0:
+            profitability = price_sum / output_count / cost / STEAM_TAX_THRESHOLD
+            if len(chosen) >= 3 and profitability >= min_profitability:
+                combinations.append(build_combination(
+                    original_tradeup, [(original_case, chosen[0][1])] + [(others[j][0], count) for j, count in chosen[1:]],
+                    [original_outcomes] + [others[j][1] for j, _ in chosen[1:]],
+                    {others[j][0]: others[j][3] for j, _ in chosen[1:]},
+                    cost, price_sum / output_count))
+            return
+        if len(chosen) == max_collections or next_index == len(others):
+            return
+
+        best_mean = max(price_sum / output_count, suffix_max_means[next_index])
+        if best_mean / (cost + remaining * suffix_min_fillers[next_index]) / STEAM_TAX_THRESHOLD < min_profitability:
+            return
+
+        for j in range(next_index, len(others)):
+            _, outcomes, filler_price, _ = others[j]
+            for count in range(1, remaining + 1):
+                search(j + 1, remaining - count, chosen + [(j, count)], price_sum + count * outcomes['prices'].sum(),
+                       output_count + count * len(outcomes['names']), cost + count * filler_price)
+
+    for num_original in range(1, 9):  # leaves room for at least two other collections
+        search(0, 10 - num_original, [(None, num_original)], num_original * original_outcomes['prices'].sum(),
+               num_original * len(original_outcomes['names']), num_original * original_price)
+
+    return combinations
+
 def group_tradeups(tradeups):
     groups = defaultdict(list)
     for tradeup in tradeups:
@@ -116,10 +217,39 @@ def group_tradeups(tradeups):
         groups[key].append(tradeup)
     return groups
 
-def main():
-    skins, cases = read_skins_csv('skins.csv')
-    market_data = read_market_data_csv('searched_market_data.csv')
-    
+def init_worker(skins_file, market_data_file):
+    # Every worker loads the skins, price index and min price tables once and keeps its own outcome cache
+    global worker_skins, worker_cases, worker_price_index, worker_outcome_cache, worker_min_price_tables
+    worker_skins, worker_cases = read_skins_csv(skins_file)
+    worker_price_index = MarketPriceIndex.from_csv(market_data_file)
+    worker_outcome_cache = {}
+    worker_min_price_tables = build_min_price_tables(worker_skins, worker_price_index)
+
+def generate_combo_lines(tradeups, max_collections, min_profitability):
+    # Combos of a chunk of best tradeups, already serialized as JSONL lines
+    lines = []
+    for tradeup in tradeups:
+        new_tradeups = generate_tradeup_combinations(tradeup, worker_skins, worker_cases, worker_price_index,
+                                                     worker_outcome_cache, worker_min_price_tables)
+        if max_collections > 2:
+            new_tradeups += generate_multi_collection_combinations(tradeup, worker_skins, worker_cases, worker_price_index,
+                                                                   worker_outcome_cache, worker_min_price_tables,
+                                                                   max_collections, min_profitability)
+        for new_tradeup in new_tradeups:
+            # Remove 'Theoretical Max Profitablity' and the single-case 'Float Range'
+            new_tradeup.pop('Theoretical Max Profitablity', None)
+            new_tradeup.pop('Float Range', None)
+            lines.append(json.dumps(new_tradeup) + '\n')
+    return lines
+
+def positive_int(value):
+    # argparse type for counts that must be at least 1
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def main(max_collections, min_profitability, workers, chunk_size):
     with open('profitable_tradeups.jsonl', 'r') as f:
         original_tradeups = [json.loads(line) for line in f]
     
@@ -128,20 +258,45 @@ def main():
     
     # Select best tradeup from each group (highest float)
     best_tradeups = [max(group, key=lambda x: x['Average Float']) for group in grouped_tradeups.values()]
+    chunks = [best_tradeups[i:i + chunk_size] for i in range(0, len(best_tradeups), chunk_size)]
     
-    all_new_tradeups = []
+    with open('combos_to_check.jsonl', 'w') as f, tqdm(total=len(best_tradeups), desc="Processing trade-ups") as progress:
+        if workers == 1:
+            init_worker('skins.csv', 'searched_market_data.csv')
+            for chunk in chunks:
+                f.writelines(generate_combo_lines(chunk, max_collections, min_profitability))
+                progress.update(len(chunk))
+            return
     
-    for tradeup in tqdm(best_tradeups, desc="Processing trade-ups"):
-        new_tradeups = generate_tradeup_combinations(tradeup, skins, cases, market_data)
-        all_new_tradeups.extend(new_tradeups)
-    
-    # Write new tradeups to a file
-    with open('combos_to_check.jsonl', 'w') as f:
-        for tradeup in all_new_tradeups:
-            # Remove 'Theoretical Max Profitablity'
-            tradeup.pop('Theoretical Max Profitablity', None)
-            json.dump(tradeup, f)
-            f.write('\n')
+        # Chunks are written out in completion order as the sorter does not depend on the order of
+        # combos_to_check.jsonl. Only a few chunks per worker are in flight so memory stays bounded
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                                    initializer=init_worker,
+                                                    initargs=('skins.csv', 'searched_market_data.csv')) as executor:
+            chunks = iter(chunks)
+            pending = {}
+            while True:
+                while len(pending) < 2 * workers:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    pending[executor.submit(generate_combo_lines, chunk, max_collections, min_profitability)] = len(chunk)
+                if not pending:
+                    break
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    f.writelines(future.result())
+                    progress.update(pending.pop(future))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Generate mixed-collection combos from profitable_tradeups.jsonl.')
+    parser.add_argument('--max-collections', type=int, default=2,
+                        help='also search mixes of 3 up to this many collections (branch and bound)')
+    parser.add_argument('--min-profitability', type=float, default=1.0,
+                        help="minimum 'Real Profitablity' of the 3+ collection mixes that are kept")
+    parser.add_argument('--workers', type=positive_int, default=os.cpu_count(),
+                        help='number of worker processes, 1 runs everything in this process')
+    parser.add_argument('--chunk-size', type=positive_int, default=16, help='best tradeups per worker task')
+    args = parser.parse_args()
+
+    main(args.max_collections, args.min_profitability, args.workers, args.chunk_size)
\ No newline at end of file
@@ -1,26 +1,24 @@
-import pycuda.driver as cuda
-import pycuda.autoinit
-from pycuda.compiler import SourceModule
-import pycuda.gpuarray as gpuarray
 import numpy as np
 import json
 from tqdm import tqdm
 import re
+import os
+import argparse
+import concurrent.futures
+import hashlib
+import sqlite3
 
 
-# Load data from the JSONL file
-data = []
-with open('combos_to_check.jsonl', 'r') as file:
-    for line in file:
-        data.append(json.loads(line))
-
 # Constants
 num_runs = 100000  # Number of simulation runs
 max_steps = 100000  # Maximum number of steps to simulate
 profit_threshold = 1.05  # 5% profit threshold
+STEAM_TAX = 1.15
+MIN_CONFIDENCE_HITS = 30  # Hits an entry needs before its confidence interval is trusted to stop it early
+SIMULATION_CACHE_FILE = '.temp/simulation_cache.sqlite'
 
 # CUDA kernel
-mod = SourceModule("""
+KERNEL_SOURCE = """
 __device__ unsigned int wang_hash(unsigned int seed)
 {
     seed = (seed ^ 61) ^ (seed >> 16);
@@ -31,17 +29,25 @@ __device__ unsigned int wang_hash(unsigned int seed)
     return seed;
 }
 
-__global__ void simulate_profitability(float *output_prices, int num_prices, float total_input_cost, 
-                                       int num_runs, int max_steps, float profit_threshold, int *num_steps_to_profit) {
-    int idx = blockIdx.x * blockDim.x + threadIdx.x;
-    if (idx < num_runs) {
-        unsigned int seed = idx;
-        
+__global__ void simulate_profitability(float *output_prices, int *offsets, int *counts, float *total_input_costs,
+                                       unsigned int *entry_seeds, int num_entries, int run_start, int num_runs,
+                                       int max_steps, float profit_threshold, int *num_steps_to_profit) {
+    // One thread per (entry, run) for runs run_start .. run_start + num_runs - 1. Each entry's prices sit at
+    // offsets[entry] in the packed output_prices and run r of an entry starts its hash chain at r ^ entry_seeds[entry].
+    // The walk index is 64-bit as num_entries * num_runs can pass 2^31
+    long long idx = (long long)blockIdx.x * blockDim.x + threadIdx.x;
+    if (idx < (long long)num_entries * num_runs) {
+        int entry = (int)(idx / num_runs);
+        unsigned int seed = (unsigned int)(run_start + (int)(idx % num_runs)) ^ entry_seeds[entry];
+        float *entry_output_prices = output_prices + offsets[entry];
+        int num_prices = counts[entry];
+        float total_input_cost = total_input_costs[entry];
+
         float cumulative_profitability = 1.0f;
         for (int step = 0; step < max_steps; step++) {
             seed = wang_hash(seed);
             int price_idx = seed % num_prices;
-            float output_price = output_prices[price_idx];
+            float output_price = entry_output_prices[price_idx];
             float step_profitability = output_price / (total_input_cost * 1.15f);
             cumulative_profitability *= step_profitability;
             if (cumulative_profitability >= profit_threshold) {
@@ -52,58 +58,375 @@ __global__ void simulate_profitability(float *output_prices, int num_prices, flo
         num_steps_to_profit[idx] = max_steps + 1;
     }
 }
-""")
+"""
 
 def get_output_prices(tradeup):
     outputs_details = tradeup.get('outputs_details', {})
     return [details[0] for details in outputs_details.values()]
 
-simulate_profitability = mod.get_function("simulate_profitability")
-
-def simulate_profitability_for_entry(output_prices_list, total_input_cost, num_runs, max_steps, entry_id):
+def get_step_profitabilities(output_prices_list, total_input_cost):
+    # Same float32 arithmetic as the kernel: output_price / (total_input_cost * 1.15f)
     output_prices = np.array(output_prices_list, dtype=np.float32)
-    d_output_prices = cuda.mem_alloc(output_prices.nbytes)
-    cuda.memcpy_htod(d_output_prices, output_prices)
-
-    num_steps_to_profit = np.zeros(num_runs, dtype=np.int32)
-    d_num_steps_to_profit = cuda.mem_alloc(num_steps_to_profit.nbytes)
-
-    block_size = 512
-    grid_size = (num_runs + block_size - 1) // block_size
-
-    simulate_profitability(
-        d_output_prices, np.int32(len(output_prices_list)), np.float32(total_input_cost),
-        np.int32(num_runs), np.int32(max_steps), np.float32(profit_threshold),
-        d_num_steps_to_profit,
-        block=(block_size, 1, 1), grid=(grid_size, 1)
-    )
-
-    cuda.memcpy_dtoh(num_steps_to_profit, d_num_steps_to_profit)
-    
-    valid_steps = num_steps_to_profit[num_steps_to_profit <= max_steps]
-    if len(valid_steps) == 0:
+    return output_prices / (np.float32(total_input_cost) * np.float32(STEAM_TAX))
+
+def pack_entries(output_prices_lists, total_input_costs):
+    # Ragged buffer of every entry's output prices, entry i owns output_prices[offsets[i]:offsets[i] + counts[i]]
+    counts = np.array([len(output_prices_list) for output_prices_list in output_prices_lists], dtype=np.int32)
+    offsets = np.zeros(len(counts), dtype=np.int32)
+    offsets[1:] = np.cumsum(counts)[:-1]
+    output_prices = np.concatenate([np.array(output_prices_list, dtype=np.float32) for output_prices_list in output_prices_lists])
+    return output_prices, offsets, counts, np.array(total_input_costs, dtype=np.float32)
+
+class CudaSimulator:
+    # Runs the simulate_profitability kernel over a batch of entries in one launch, one thread per
+    # (entry, run). Device and host buffers are kept between batches and only grown when a batch needs more
+
+    def __init__(self):
+        # pycuda is only imported when the CUDA backend is used so the CPU backend runs without it
+        global cuda
+        import pycuda.driver as cuda
+        import pycuda.autoinit
+        from pycuda.compiler import SourceModule
+        self.simulate_profitability = SourceModule(KERNEL_SOURCE).get_function("simulate_profitability")
+        self.device_buffers = {}
+        self.host_num_steps_to_profit = np.empty(0, dtype=np.int32)
+
+    def get_device_buffer(self, name, nbytes):
+        buffer, size = self.device_buffers.get(name, (None, 0))
+        if size < nbytes:
+            if buffer is not None:
+                buffer.free()
+            buffer = cuda.mem_alloc(nbytes)
+            self.device_buffers[name] = (buffer, nbytes)
+        return buffer
+
+    def copy_to_device(self, name, array):
+        buffer = self.get_device_buffer(name, array.nbytes)
+        cuda.memcpy_htod(buffer, array)
+        return buffer
+
+    def simulate_batch(self, output_prices_lists, total_input_costs, entry_seeds, run_start, num_runs, max_steps, profit_threshold):
+        output_prices, offsets, counts, costs = pack_entries(output_prices_lists, total_input_costs)
+        num_walks = len(counts) * num_runs
+        if len(self.host_num_steps_to_profit) < num_walks:
+            self.host_num_steps_to_profit = np.empty(num_walks, dtype=np.int32)
+        num_steps_to_profit = self.host_num_steps_to_profit[:num_walks]
+        d_num_steps_to_profit = self.get_device_buffer('num_steps_to_profit', num_steps_to_profit.nbytes)
+
+        block_size = 512
+        grid_size = (num_walks + block_size - 1) // block_size
+
+        self.simulate_profitability(
+            self.copy_to_device('output_prices', output_prices), self.copy_to_device('offsets', offsets),
+            self.copy_to_device('counts', counts), self.copy_to_device('total_input_costs', costs),
+            self.copy_to_device('entry_seeds', np.array(entry_seeds, dtype=np.uint32)), np.int32(len(counts)),
+            np.int32(run_start), np.int32(num_runs), np.int32(max_steps), np.float32(profit_threshold),
+            d_num_steps_to_profit,
+            block=(block_size, 1, 1), grid=(grid_size, 1)
+        )
+
+        cuda.memcpy_dtoh(num_steps_to_profit, d_num_steps_to_profit)
+        return num_steps_to_profit.reshape(len(counts), num_runs).copy()
+
+def wang_hash(seed):
+    # uint32 numpy version of the kernel's wang_hash, multiplications wrap like unsigned int
+    seed = (seed ^ np.uint32(61)) ^ (seed >> np.uint32(16))
+    seed *= np.uint32(9)
+    seed ^= seed >> np.uint32(4)
+    seed *= np.uint32(0x27d4eb2d)
+    seed ^= seed >> np.uint32(15)
+    return seed
+
+class CpuSimulator:
+    # NumPy replica of the simulate_profitability kernel. Every run uses the kernel's wang_hash
+    # chain with the same starting state and the same float32 products, so the steps match the kernel
+    # run for run. The walks of a whole batch of entries are stepped together in chunks and
+    # finished walks are dropped as they go.
+
+    def __init__(self, chunk_size=262144, prune_interval=64):
+        self.chunk_size = chunk_size
+        self.prune_interval = prune_interval
+
+    def simulate_batch(self, output_prices_lists, total_input_costs, entry_seeds, run_start, num_runs, max_steps, profit_threshold):
+        output_prices, offsets, counts, costs = pack_entries(output_prices_lists, total_input_costs)
+        step_profitabilities = output_prices / (np.repeat(costs, counts) * np.float32(STEAM_TAX))
+        entry_seeds = np.array(entry_seeds, dtype=np.uint32)
+        threshold = np.float32(profit_threshold)
+        num_walks = len(counts) * num_runs
+        num_steps_to_profit = np.full(num_walks, max_steps + 1, dtype=np.int32)
+
+        # A walk that can't reach the threshold even if every remaining step were the best outcome of its
+        # entry is dropped. 1e-7 per step bounds the float32 rounding of the running product, so no walk
+        # that could still hit is dropped
+        max_log_steps = np.log(np.maximum.reduceat(step_profitabilities, offsets).astype(np.float64)) + 1e-7
+        log_threshold = np.log(np.float64(threshold))
+
+        for chunk_start in range(0, num_walks, self.chunk_size):
+            walk_indices = np.arange(chunk_start, min(chunk_start + self.chunk_size, num_walks))
+            entries = walk_indices // num_runs
+            seeds = (run_start + walk_indices % num_runs).astype(np.uint32) ^ entry_seeds[entries]
+            walk_offsets = offsets[entries]
+            walk_counts = counts[entries].astype(np.uint32)
+            cumulative_profitability = np.ones(len(walk_indices), dtype=np.float32)
+
+            for step in range(max_steps):
+                seeds = wang_hash(seeds)
+                cumulative_profitability *= step_profitabilities[walk_offsets + seeds % walk_counts]
+
+                # Finished walks are dropped every step. In a large batch some walk hits on almost every
+                # step, so the prune check runs on its own schedule rather than only on steps without hits
+                hit = cumulative_profitability >= threshold
+                prune = (step + 1) % self.prune_interval == 0
+                if not (prune or hit.any()):
+                    continue
+
+                num_steps_to_profit[walk_indices[hit]] = step + 1
+                active = ~hit
+                if prune:
+                    with np.errstate(divide='ignore'):
+                        best_case = np.log(cumulative_profitability.astype(np.float64)) + (max_steps - step - 1) * max_log_steps[entries]
+                    active &= best_case >= log_threshold
+
+                walk_indices = walk_indices[active]
+                entries = entries[active]
+                seeds = seeds[active]
+                walk_offsets = walk_offsets[active]
+                walk_counts = walk_counts[active]
+                cumulative_profitability = cumulative_profitability[active]
+                if len(walk_indices) == 0:
+                    break
+
+        return num_steps_to_profit.reshape(len(counts), num_runs)
+
+def get_simulator(backend, chunk_size):
+    if backend == 'cuda':
+        return CudaSimulator()
+    return CpuSimulator(chunk_size)
+
+def summarize_num_steps(valid_count, valid_sum, total_runs, max_steps, entry_id):
+    # Mean steps of the walks that reached the threshold and the fraction of walks that did
+    if valid_count == 0:
         print(f"No valid steps for entry ID {entry_id}. Setting num_steps_needed to {max_steps + 1}.")
-        return max_steps + 1
+        return max_steps + 1, 0.0
+    return valid_sum / valid_count, valid_count / total_runs
+
+def simulate_batch_task(simulator, output_prices_lists, total_input_costs, entry_seeds, entry_ids, relative_tolerance, initial_runs):
+    # Simulates a batch of entries together and returns (num_steps_needed, hit_probability) per entry.
+    # Runs are simulated in rounds that start at initial_runs and double, as every round pays for its
+    # slowest walk. An entry stops once it has MIN_CONFIDENCE_HITS hits and the 95% confidence interval of
+    # its mean steps is within relative_tolerance of the mean, or after num_runs runs. With fewer hits the
+    # normal approximation is noise, so entries that rarely hit run to the cap. As the runs keep their seeds,
+    # an entry that runs to the cap gets exactly the result of simulating num_runs at once
+    round_runs = initial_runs if relative_tolerance > 0 else num_runs
+    valid_counts = np.zeros(len(entry_ids))
+    valid_sums = np.zeros(len(entry_ids))
+    valid_square_sums = np.zeros(len(entry_ids))
+    total_runs = np.zeros(len(entry_ids))
+    active = np.arange(len(entry_ids))
+
+    run_start = 0
+    while run_start < num_runs:
+        round_runs = min(round_runs, num_runs - run_start)
+        num_steps_to_profit = simulator.simulate_batch([output_prices_lists[i] for i in active], [total_input_costs[i] for i in active],
+                                                       [entry_seeds[i] for i in active], run_start, round_runs, max_steps, profit_threshold)
+        valid_steps = np.where(num_steps_to_profit <= max_steps, num_steps_to_profit, 0).astype(np.float64)
+        valid_counts[active] += (num_steps_to_profit <= max_steps).sum(axis=1)
+        valid_sums[active] += valid_steps.sum(axis=1)
+        valid_square_sums[active] += (valid_steps ** 2).sum(axis=1)
+        total_runs[active] += round_runs
+        run_start += round_runs
+        round_runs *= 2
+
+        counts = valid_counts[active]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = valid_sums[active] / counts
+            variances = (valid_square_sums[active] - counts * means ** 2) / (counts - 1)
+            half_widths = 1.96 * np.sqrt(np.maximum(variances, 0) / counts)
+        active = active[~((counts >= MIN_CONFIDENCE_HITS) & (half_widths <= relative_tolerance * means))]
+        if len(active) == 0:
+            break
+
+    return [summarize_num_steps(valid_counts[i], valid_sums[i], total_runs[i], max_steps, entry_id) for i, entry_id in enumerate(entry_ids)]
 
-    mean_steps = np.mean(valid_steps)
-    if np.isnan(mean_steps):
-        print(f"Encountered NaN for entry ID {entry_id} with total_input_cost {total_input_cost} and output_prices_list {output_prices_list}. Setting num_steps_needed to {max_steps + 1}.")
-        return max_steps + 1
+def get_simulation_key(output_prices_list, total_input_cost, seed, shared_streams, relative_tolerance, initial_runs):
+    # Identifies a simulation by everything its result depends on. The prices stay in the order they are
+    # simulated in, as a seeded stream draws outcomes by their index
+    key = json.dumps([list(output_prices_list), total_input_cost, num_runs, max_steps, profit_threshold, seed,
+                      shared_streams, relative_tolerance, initial_runs])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
 
-    return mean_steps
+def get_entry_seed(simulation_key, shared_streams):
+    # Every entry gets its own stream derived from its simulation key, which includes the --seed.
+    # shared_streams keeps the kernel's original streams where run r of every entry starts at state r
+    if shared_streams:
+        return 0
+    return int(simulation_key[:8], 16)
 
-# Process each entry in the data with a progress bar
-for entry_id, entry in enumerate(tqdm(data, desc="Processing entries")):
-    output_prices_list = get_output_prices(entry)
-    total_input_cost = entry['Total Input Cost']
+def open_simulation_cache(cache_file):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    connection = sqlite3.connect(cache_file)
+    connection.execute('CREATE TABLE IF NOT EXISTS simulations '
+                       '(key TEXT PRIMARY KEY, num_steps_needed REAL, hit_probability REAL)')
+    return connection
 
-    num_steps_needed = simulate_profitability_for_entry(output_prices_list, total_input_cost, num_runs, max_steps, entry_id)
-    simulation_cost = num_steps_needed * total_input_cost
-    entry['num_steps_needed'] = float(num_steps_needed)
-    entry['simulation_cost'] = float(simulation_cost)
+def load_cached_results(connection, keys):
+    # {key: (num_steps_needed, hit_probability)} of the keys already in the cache
+    keys = list(keys)
+    cached_results = {}
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        rows = connection.execute(f"SELECT key, num_steps_needed, hit_probability FROM simulations "
+                                  f"WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+        for key, num_steps_needed, hit_probability in rows:
+            cached_results[key] = (num_steps_needed, hit_probability)
+    return cached_results
 
-# Sort the data based on the total simulation cost
-data.sort(key=lambda x: x['simulation_cost'])
+def save_cached_results(connection, results):
+    # results is a list of (key, num_steps_needed, hit_probability)
+    connection.executemany('INSERT OR REPLACE INTO simulations VALUES (?, ?, ?)', results)
+    connection.commit()
+
+def estimate_first_passage(output_prices_list, total_input_cost, profit_threshold, drift_tolerance, max_exact_steps=8, max_positions=100000):
+    # Every tradeup adds log(output_price / (total_input_cost * 1.15)) to the walk, so steps to profit is
+    # the first passage of a random walk over log(profit_threshold). The first few steps are enumerated
+    # exactly, merging walks that sit at the same position. From every walk still below the barrier the
+    # rest is approximated from the drift and variance of a step:
+    #   positive drift: Wald, E[T] = (d + overshoot) / drift and the walk always gets there
+    #   negative drift: P(hit) = exp(-2 |drift| (d + overshoot) / variance), E[T | hit] = (d + overshoot) / |drift|
+    # with Siegmund's overshoot correction of 0.583 standard deviations. Returns (mean steps of the walks
+    # that hit, hit probability), or None when the drift is too close to zero for these to hold.
+    # An outcome worth nothing sends the walk to -inf for good, which the drift and variance can't
+    # describe, so entries with a non-positive output price are also left to the simulation
+    if min(output_prices_list) <= 0:
+        return None
+    log_steps = np.log(get_step_profitabilities(output_prices_list, total_input_cost).astype(np.float64))
+    log_threshold = np.log(np.float64(np.float32(profit_threshold)))
+    drift = log_steps.mean()
+    variance = log_steps.var()
+    if abs(drift) <= drift_tolerance * np.sqrt(variance):
+        return None
+
+    positions = np.zeros(1)
+    probabilities = np.ones(1)
+    hit_probability = 0.0
+    hit_steps = 0.0
+    for step in range(1, max_exact_steps + 1):
+        positions, inverse = np.unique((positions[:, None] + log_steps[None, :]).ravel(), return_inverse=True)
+        probabilities = np.bincount(inverse.ravel(), weights=np.repeat(probabilities, len(log_steps)) / len(log_steps))
+
+        hit = positions >= log_threshold
+        hit_probability += probabilities[hit].sum()
+        hit_steps += step * probabilities[hit].sum()
+        positions = positions[~hit]
+        probabilities = probabilities[~hit]
+        if len(positions) == 0 or len(positions) * len(log_steps) > max_positions:
+            break
+
+    distances = log_threshold - positions + 0.583 * np.sqrt(variance)
+    if drift > 0:
+        remaining_hit_probabilities = np.ones_like(distances)
+    else:
+        remaining_hit_probabilities = np.exp(-2 * abs(drift) * distances / variance)
+    remaining_steps = distances / abs(drift)
+
+    hit_probability += (probabilities * remaining_hit_probabilities).sum()
+    hit_steps += (probabilities * remaining_hit_probabilities * (step + remaining_steps)).sum()
+    return hit_steps / hit_probability, hit_probability
+
+def get_lundberg_exponent(log_steps):
+    # theta > 0 with mean(exp(theta * log_step)) = 1 for a walk with negative drift that can step up.
+    # The walk ever climbs d above where it is with probability at most exp(-theta * d)
+    low, high = 0.0, 1.0
+    while np.mean(np.exp(high * log_steps)) < 1:
+        high *= 2
+    for _ in range(60):
+        middle = (low + high) / 2
+        if np.mean(np.exp(middle * log_steps)) < 1:
+            low = middle
+        else:
+            high = middle
+    return low
+
+def fft_first_passage(output_prices_list, total_input_cost, profit_threshold, horizon, lattice_bins, epsilon=1e-12):
+    # Distribution of the walk over the first horizon tradeups, approximated on a lattice of
+    # log(profit_threshold) / lattice_bins: every log step is rounded to the nearest lattice point, so the
+    # result gets closer to the simulation as lattice_bins grows. Every step the mass still below the barrier
+    # is convolved with the step distribution through FFTs and whatever lands on or above the barrier is
+    # absorbed as hitting at that step. Mass deeper than any walk could climb back from, with probability
+    # above epsilon, is dropped along with the deepest epsilon of mass every step, which also clears FFT
+    # round-off, and the loop stops once less than epsilon is left.
+    # Returns (mean steps of the walks that hit within horizon, hit probability), or None for entries with a
+    # non-positive output price, whose log step of -inf has no lattice point, and for entries whose winning
+    # steps are all smaller than half a lattice step, which the lattice would round to never growing.
+    # Both are left to the simulation
+    if min(output_prices_list) <= 0:
+        return None
+    log_steps = np.log(get_step_profitabilities(output_prices_list, total_input_cost).astype(np.float64))
+    lattice_step = np.log(np.float64(np.float32(profit_threshold))) / lattice_bins
+    lattice_steps = np.rint(log_steps / lattice_step).astype(np.int64)
+    if lattice_steps.max() <= 0:
+        if log_steps.max() > 0:
+            return None
+        return max_steps + 1, 0.0
+    lowest_step = lattice_steps.min()
+    step_pmf = np.bincount(lattice_steps - lowest_step) / len(lattice_steps)
+
+    # Deepest position below the barrier that is still tracked
+    max_depth = horizon * lattice_steps.max()
+    if lattice_steps.mean() < 0:
+        # A drift too close to zero for the exponent to resolve doesn't bound the depth any tighter
+        lundberg_exponent = get_lundberg_exponent(lattice_steps * lattice_step)
+        if lundberg_exponent > 0:
+            max_depth = min(max_depth, int(np.ceil(np.log(1 / epsilon) / (lundberg_exponent * lattice_step))))
+
+    # surviving[i] is the mass at lattice position surviving_start + i, every position is below the barrier
+    surviving = np.ones(1)
+    surviving_start = 0
+    step_pmf_ffts = {}
+    hit_probability = 0.0
+    hit_steps = 0.0
+    for step in range(1, horizon + 1):
+        size = len(surviving) + len(step_pmf) - 1
+        fft_size = 1 << (size - 1).bit_length()
+        if fft_size not in step_pmf_ffts:
+            step_pmf_ffts[fft_size] = np.fft.rfft(step_pmf, fft_size)
+        positions = np.fft.irfft(np.fft.rfft(surviving, fft_size) * step_pmf_ffts[fft_size], fft_size)[:size]
+        positions = np.maximum(positions, 0)
+        positions_start = surviving_start + lowest_step
+
+        # Absorb everything at or above the barrier
+        barrier_index = max(lattice_bins - positions_start, 0)
+        hit = positions[barrier_index:].sum()
+        hit_probability += hit
+        hit_steps += step * hit
+
+        # Keep what is below the barrier and not too deep to come back
+        lowest_index = max(-max_depth - positions_start, 0)
+        lowest_index = max(lowest_index, np.searchsorted(np.cumsum(positions[:barrier_index]), epsilon))
+        surviving = positions[lowest_index:barrier_index]
+        surviving_start = positions_start + lowest_index
+        if surviving.sum() < epsilon:
+            break
+
+    if hit_probability == 0:
+        return max_steps + 1, 0.0
+    return hit_steps / hit_probability, hit_probability
+
+def score_entry_without_simulation(mode, drift_tolerance, horizon, lattice_bins, output_prices_list, total_input_cost, entry_id):
+    # (num_steps_needed, hit_probability) of the entries that don't need simulating, None for the rest
+    # No walk can ever grow if no outcome beats the input cost plus tax
+    if get_step_profitabilities(output_prices_list, total_input_cost).max() <= 1:
+        print(f"No valid steps for entry ID {entry_id}. Setting num_steps_needed to {max_steps + 1}.")
+        return max_steps + 1, 0.0
+
+    if mode == 'fft':
+        return fft_first_passage(output_prices_list, total_input_cost, profit_threshold, horizon, lattice_bins)
+    if mode == 'analytic':
+        estimate = estimate_first_passage(output_prices_list, total_input_cost, profit_threshold, drift_tolerance)
+        # Entries that would take longer than max_steps are left to the simulation, which caps them
+        if estimate is not None and estimate[0] <= max_steps:
+            return estimate
+    return None
 
 def custom_json_dump(obj, file):
     # Convert the object to a JSON string
@@ -111,8 +434,128 @@ def custom_json_dump(obj, file):
     json_str = re.sub(r'â™¥', '♥', json_str)
     file.write(json_str + '\n')
 
-with open('combos_to_check_sorted.jsonl', 'w', encoding='utf-8') as jsonl_file:
-    for entry in data:
-        custom_json_dump(entry, jsonl_file)
+def positive_int(value):
+    # argparse type for counts that must be at least 1
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def main(backend, mode, drift_tolerance, horizon, lattice_bins, workers, chunk_size, batch_size, seed, shared_streams, cache_file,
+         relative_tolerance, initial_runs):
+    # Load data from the JSONL file
+    data = []
+    with open('combos_to_check.jsonl', 'r') as file:
+        for line in file:
+            data.append(json.loads(line))
+
+    # Score what doesn't need simulating first, the fft mode is spread over the process pool
+    tasks = [(mode, drift_tolerance, horizon, lattice_bins, get_output_prices(entry), entry['Total Input Cost'], entry_id)
+             for entry_id, entry in enumerate(data)]
+    if mode == 'fft' and workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(tqdm(executor.map(score_entry_without_simulation, *zip(*tasks), chunksize=16),
+                                total=len(tasks), desc="Scoring entries"))
+    else:
+        results = [score_entry_without_simulation(*task) for task in tasks]
+
+    # Entries left to simulate are grouped by simulation key so identical entries are simulated once
+    entries_by_key = {}
+    for entry_id, entry in enumerate(data):
+        if results[entry_id] is None:
+            key = get_simulation_key(get_output_prices(entry), entry['Total Input Cost'], seed, shared_streams,
+                                     relative_tolerance, initial_runs)
+            entries_by_key.setdefault(key, []).append(entry_id)
+
+    connection = None
+    if cache_file:
+        connection = open_simulation_cache(cache_file)
+        cached_results = load_cached_results(connection, entries_by_key)
+        for key, result in cached_results.items():
+            for entry_id in entries_by_key.pop(key):
+                results[entry_id] = result
+        print(f"Reused {len(cached_results)} cached simulations")
+
+    # The remaining entries are simulated in batches that share one kernel launch or vectorized pass
+    simulator = get_simulator(backend, chunk_size)
+    keys = list(entries_by_key)
+    batch_key_lists = [keys[batch_start:batch_start + batch_size] for batch_start in range(0, len(keys), batch_size)]
+    batches = []
+    for batch_keys in batch_key_lists:
+        entry_ids = [entries_by_key[key][0] for key in batch_keys]
+        batches.append(([get_output_prices(data[entry_id]) for entry_id in entry_ids],
+                        [data[entry_id]['Total Input Cost'] for entry_id in entry_ids],
+                        [get_entry_seed(key, shared_streams) for key in batch_keys], entry_ids, relative_tolerance, initial_runs))
+
+    def store_batch_results(batch_keys, batch_results):
+        for key, result in zip(batch_keys, batch_results):
+            for entry_id in entries_by_key[key]:
+                results[entry_id] = result
+        if connection is not None:
+            save_cached_results(connection, [(key, float(num_steps_needed), float(hit_probability))
+                                             for key, (num_steps_needed, hit_probability) in zip(batch_keys, batch_results)])
+        progress.update(len(batch_keys))
+
+    # Process the batches with a progress bar. The CPU backend spreads batches over a process pool,
+    # the CUDA backend already runs every walk of a batch in parallel. Results are cached as every
+    # batch finishes so an interrupted run keeps its progress
+    with tqdm(total=len(keys), desc="Processing entries") as progress:
+        if backend == 'cpu' and workers > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                batch_results = executor.map(simulate_batch_task, *zip(*[(simulator,) + batch for batch in batches]))
+                for batch_keys, batch_result in zip(batch_key_lists, batch_results):
+                    store_batch_results(batch_keys, batch_result)
+        else:
+            for batch_keys, batch in zip(batch_key_lists, batches):
+                store_batch_results(batch_keys, simulate_batch_task(simulator, *batch))
+
+    if connection is not None:
+        connection.close()
+
+    for entry, (num_steps_needed, hit_probability) in zip(data, results):
+        total_input_cost = entry['Total Input Cost']
+        simulation_cost = num_steps_needed * total_input_cost
+        entry['num_steps_needed'] = float(num_steps_needed)
+        entry['simulation_cost'] = float(simulation_cost)
+        entry['hit_probability'] = float(hit_probability)
+
+    # Sort the data based on the total simulation cost
+    data.sort(key=lambda x: x['simulation_cost'])
+
+    with open('combos_to_check_sorted.jsonl', 'w', encoding='utf-8') as jsonl_file:
+        for entry in data:
+            custom_json_dump(entry, jsonl_file)
+
+    print("processed JSONL file created as 'combos_to_check_sorted.jsonl'")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sort combos_to_check.jsonl by simulated cost to reach profit.')
+    parser.add_argument('--backend', choices=['cuda', 'cpu'], default='cuda',
+                        help='cuda: pycuda kernel, cpu: NumPy replica of the kernel for hosts without a GPU')
+    parser.add_argument('--mode', choices=['simulate', 'analytic', 'fft'], default='simulate',
+                        help='simulate: Monte Carlo walks, analytic: first-passage estimate from the drift and variance of '
+                             'the log step profitability, simulating only entries with near zero drift, '
+                             'fft: lattice approximation of the walk over --horizon tradeups by FFT convolution')
+    parser.add_argument('--drift-tolerance', type=float, default=0.05,
+                        help='analytic mode simulates entries whose |drift| is within this many standard deviations of zero')
+    parser.add_argument('--horizon', type=positive_int, default=1000, help='tradeups followed by the fft mode')
+    parser.add_argument('--lattice-bins', type=positive_int, default=20,
+                        help='lattice points between no profit and profit_threshold in the fft mode')
+    parser.add_argument('--workers', type=positive_int, default=os.cpu_count(), help='processes used by the cpu backend')
+    parser.add_argument('--chunk-size', type=positive_int, default=262144, help='walks stepped together by the cpu backend')
+    parser.add_argument('--batch-size', type=positive_int, default=64, help='entries simulated together in one launch or pass')
+    parser.add_argument('--relative-tolerance', type=float, default=0.05,
+                        help='stop simulating an entry once it has MIN_CONFIDENCE_HITS hits and the 95%% confidence interval '
+                             'of its mean steps is within this fraction of the mean, 0 always simulates num_runs runs')
+    parser.add_argument('--initial-runs', type=positive_int, default=2000,
+                        help='runs of the first round, every later round simulates twice as many until the interval is narrow enough')
+    parser.add_argument('--seed', type=int, default=0, help='mixed into the stream every entry derives from its simulation key')
+    parser.add_argument('--shared-streams', action='store_true',
+                        help='run r of every entry starts at state r like the original kernel, instead of per-entry streams')
+    parser.add_argument('--cache', default=SIMULATION_CACHE_FILE, help='SQLite file simulation results are cached in')
+    parser.add_argument('--no-cache', action='store_true', help='simulate every entry and leave the cache untouched')
+    args = parser.parse_args()
 
-print("processed JSONL file created as 'combos_to_check_sorted.jsonl'")
+    main(args.backend, args.mode, args.drift_tolerance, args.horizon, args.lattice_bins, args.workers, args.chunk_size,
+         args.batch_size, args.seed, args.shared_streams, None if args.no_cache else args.cache, args.relative_tolerance,
+         args.initial_runs)
@@ -0,0 +1,56 @@
+import csv
+import re
+import numpy as np
+
+WEAR_NAMES = ['Factory New', 'Minimal Wear', 'Field-Tested', 'Well-Worn', 'Battle-Scarred']
+
+HASH_NAME_PATTERN = re.compile(r'^(.*) \((' + '|'.join(re.escape(wear) for wear in WEAR_NAMES) + r')\)$')
+
+class MarketPriceIndex:
+    # Parses searched_market_data.csv once into a (weapon_skin, wear) -> sell_price hash index.
+    # get_price is an O(1) lookup and lookup_batch gathers whole arrays of prices at once.
+
+    def __init__(self, prices):
+        self.prices = prices
+        self._price_tables = {}
+
+    @classmethod
+    def from_rows(cls, rows):
+        # rows is an iterable of (hash_name, sell_price); the first listing of a hash_name wins
+        prices = {}
+        for hash_name, sell_price in rows:
+            match = HASH_NAME_PATTERN.match(hash_name)
+            if match:
+                prices.setdefault((match.group(1), match.group(2)), float(sell_price))
+        return cls(prices)
+
+    @classmethod
+    def from_csv(cls, filename='searched_market_data.csv'):
+        with open(filename, 'r', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            return cls.from_rows((row['hash_name'], row['sell_price']) for row in reader)
+
+    def get_price(self, weapon_skin, wear):
+        return self.prices.get((weapon_skin, wear))
+
+    def price_table(self, skin_names):
+        # (skins, wears) matrix of sell prices in WEAR_NAMES order, NaN where there is no listing
+        skin_names = tuple(skin_names)
+        if skin_names not in self._price_tables:
+            price_table = np.full((len(skin_names), len(WEAR_NAMES)), np.nan)
+            for i, skin_name in enumerate(skin_names):
+                for j, wear in enumerate(WEAR_NAMES):
+                    price = self.prices.get((skin_name, wear))
+                    if price is not None:
+                        price_table[i, j] = price
+            self._price_tables[skin_names] = price_table
+        return self._price_tables[skin_names]
+
+    def lookup_batch(self, skin_names, wear_indices):
+        # wear_indices is an array whose last axis matches skin_names, holding indices into
+        # WEAR_NAMES (-1 for no wear). Returns prices of the same shape, NaN where missing.
+        price_table = self.price_table(skin_names)
+        wear_indices = np.asarray(wear_indices)
+        skin_indices = np.arange(len(price_table))
+        prices = price_table[skin_indices, np.clip(wear_indices, 0, None)]
+        return np.where(wear_indices >= 0, prices, np.nan)
@@ -0,0 +1,18 @@
+import orjson
+
+# processed_items.json holds one columnar item table and the tradeups that reference it:
+#   {"items": {"name": [...], "case_name": [...], "rarity": [...], "price": [...], "floatvalue": [...], "source_row": [...]},
+#    "tradeups": {tradeup_key: [params, {case: [start, end]}]}}
+# The table is sorted so the items of every (case, rarity) are the contiguous rows start..end-1, and
+# source_row is the item's row in steam_data_processed.csv.
+ITEM_COLUMNS = ['name', 'case_name', 'rarity', 'price', 'floatvalue', 'source_row']
+
+def save_processed_items(items, tradeups, filename='processed_items.json'):
+    with open(filename, 'wb') as f:
+        f.write(orjson.dumps({'items': items, 'tradeups': tradeups}, option=orjson.OPT_INDENT_2))
+
+def load_processed_items(filename='processed_items.json'):
+    # Returns (items, tradeups)
+    with open(filename, 'rb') as f:
+        data = orjson.loads(f.read())
+    return data['items'], data['tradeups']
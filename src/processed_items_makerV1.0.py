@@ -1,4 +1,3 @@
-import orjson
 import pandas as pd
 import re
 import json
@@ -6,6 +5,7 @@ from tqdm import tqdm
 import os
 import requests
 import sys
+from processed_items_io import ITEM_COLUMNS, save_processed_items
 
 def get_MULTIPLIER(file_path='.temp/cached_usd.json', url='https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@latest/v1/currencies/usd.json'):
     # Ensure the .temp directory exists
@@ -67,33 +67,71 @@ def parse_case(case_str):
             cases[case_name] = number
     return cases
 
-# Process skins.csv to build a mapping from Case-Weapon_Skin to Rarity
-case_skin_rarity = {}
-for _, row in skins_data.iterrows():
-    case_name = row['Case'].strip()
-    weapon_skin = row['Weapon_Skin'].strip()
-    rarity = row['Rarity'].strip()
-    case_skin_rarity[(case_name, weapon_skin)] = rarity
-
-# Process steam_data_processed.csv to build a mapping from cleaned item names to their details
+# Index skins.csv by (Case, Weapon_Skin), keeping every case's skins in file order for the fallback below
+skins_data['Case'] = skins_data['Case'].str.strip()
+skins_data['Weapon_Skin'] = skins_data['Weapon_Skin'].str.strip()
+skins_data['Rarity'] = skins_data['Rarity'].str.strip()
+skins_data = skins_data.groupby(['Case', 'Weapon_Skin'], sort=False)['Rarity'].last().reset_index()
+case_skins = {case_name: list(zip(group['Weapon_Skin'], group['Rarity'])) for case_name, group in skins_data.groupby('Case', sort=False)}
+
+# Clean the names of steam_data_processed.csv and resolve the rarity of every distinct (Collection, item name)
+# once. Names that are exactly a Weapon_Skin of their collection are resolved with a hash join, the rest fall
+# back to the first skin of the collection whose name is contained in the item name
+steam_data['source_row'] = range(len(steam_data))
+steam_data['item_name'] = steam_data['Name'].map(clean_item_name)
+steam_data['case_name'] = steam_data['Collection'].str.strip()
+item_keys = steam_data[['case_name', 'item_name']].drop_duplicates()
+item_keys = item_keys.merge(skins_data[['Case', 'Weapon_Skin', 'Rarity']], how='left',
+                            left_on=['case_name', 'item_name'], right_on=['Case', 'Weapon_Skin'])
+
+def find_rarity(case_name, item_name):
+    for weapon_skin, rarity in case_skins.get(case_name, []):
+        if weapon_skin in item_name:
+            return rarity
+    return 'Unknown'
+
+unmatched = item_keys['Rarity'].isna()
+item_keys.loc[unmatched, 'Rarity'] = [find_rarity(case_name, item_name) for case_name, item_name
+                                      in zip(item_keys.loc[unmatched, 'case_name'], item_keys.loc[unmatched, 'item_name'])]
+steam_data = steam_data.merge(item_keys[['case_name', 'item_name', 'Rarity']].rename(columns={'Rarity': 'rarity'}),
+                              how='left', on=['case_name', 'item_name'])
+
+# Build a mapping from cleaned item names to their details
 item_details = {}
-for _, row in steam_data.iterrows():
-    item_name = clean_item_name(row['Name'])
-    case_name = row['Collection'].strip()
-    rarity = 'Unknown'  # Default value
-    for (c_name, weapon_skin), r in case_skin_rarity.items():
-        if case_name == c_name and weapon_skin in item_name:
-            rarity = r
-            break
+for item_name, case_name, price, floatvalue, rarity, source_row in zip(steam_data['item_name'], steam_data['case_name'],
+                                                                        steam_data['Price (INR)'], steam_data['floatvalue'],
+                                                                        steam_data['rarity'], steam_data['source_row'].tolist()):
     if item_name not in item_details:
         item_details[item_name] = []
     item_details[item_name].append({
         'case_name': case_name,
-        'price': row['Price (INR)'],
-        'floatvalue': row['floatvalue'],
-        'rarity': rarity
+        'price': price,
+        'floatvalue': floatvalue,
+        'rarity': rarity,
+        'source_row': source_row
     })
 
+# Bucket the items by (case, rarity) once, in the order the tradeups list them: items grouped by name in
+# order of first appearance, then in listing order
+items_by_case_rarity = {}
+for item_name, details_list in item_details.items():
+    for details in details_list:
+        items_by_case_rarity.setdefault((details['case_name'], details['rarity']), []).append(dict(details, name=item_name))
+
+# Item table of processed_items.json. Every (case, rarity) a tradeup uses is appended once as a contiguous
+# range of rows that all its tradeups reference
+items = {column: [] for column in ITEM_COLUMNS}
+item_ranges = {}
+
+def get_item_range(case_name, rarity):
+    if (case_name, rarity) not in item_ranges:
+        start = len(items['name'])
+        for item in items_by_case_rarity.get((case_name, rarity), []):
+            for column in ITEM_COLUMNS:
+                items[column].append(item[column])
+        item_ranges[(case_name, rarity)] = [start, len(items['name'])]
+    return item_ranges[(case_name, rarity)]
+
 # Define a function to process one tradeup line
 def process_tradeup_line(tradeup):
     case_str = tradeup['Case']
@@ -104,21 +142,8 @@ def process_tradeup_line(tradeup):
     tradeup_price = avg_output_price*MULTIPLIER
     input_rarity = tradeup['Input Rarity']
     
-    # Initialize result structure
-    case_items = {case: [] for case in case_details}
-    
-    # Fill the items for each case
-    for item_name, details_list in item_details.items():
-        for details in details_list:
-            if details['rarity'] == input_rarity:
-                for case_name in case_details:
-                    if details['case_name'] == case_name:
-                        case_items[case_name].append({
-                            'name': item_name,
-                            'price': details['price'],
-                            'floatvalue': details['floatvalue'],
-                            'rarity': details['rarity']
-                        })
+    # The items of each case are referenced by their rows in the item table
+    case_ranges = {case: get_item_range(case, input_rarity) for case in case_details}
 
     return {
         f"{case_str}_{input_rarity}_{avg_float}": [
@@ -128,7 +153,7 @@ def process_tradeup_line(tradeup):
                 'tradeup_price': tradeup_price,
                 'input_rarity': input_rarity
             },
-            case_items
+            case_ranges
         ]
     }
 
@@ -152,9 +177,8 @@ with open('combos_to_check.jsonl', 'r') as f:
                     print(f"Error: Key {key} is being overwritten.")
                 processed_items[key] = value
 
-# Serialize with orjson and write to file
-with open('processed_items.json', 'wb') as f:
-    f.write(orjson.dumps(processed_items, option=orjson.OPT_INDENT_2))
+# Write the item table and the tradeups to processed_items.json
+save_processed_items(items, processed_items)
 
 
 print("Processing complete. The results have been saved to processed_items.json.")
@@ -4,7 +4,7 @@ import os
 
 # Define the regex pattern
 pattern_item = re.compile(
-    r"(Best Tradeup: .*?)\n(Best Individual: \[.*?\])\nprice_deviation: (-?\d+\.\d+)\nfloat_deviation: (-?\d+\.\d+)\n------"
+    r"(Best Tradeup: .*?)\n(Best Individual: \[.*?\])\n(?:(Best Items: \[.*?\])\n)?price_deviation: (-?\d+\.\d+)\nfloat_deviation: (-?\d+\.\d+)\n------"
 )
 
 # Initialize an empty list to store the items with their profitability
@@ -35,8 +35,9 @@ for filepath in glob.glob(os.path.join(current_dir, "best*.txt")):
         for match in matches:
             best_tradeup = match[0]
             best_individual = match[1]
-            price_deviation = float(match[2])
-            float_deviation = float(match[3])
+            best_items_line = f"{match[2]}\n" if match[2] else ""  # no Best Items line in results written before the GA recorded the item rows
+            price_deviation = float(match[3])
+            float_deviation = float(match[4])
             
             # Extract prices and floats from best_individual
             best_individual_values = eval(best_individual.split(": ")[1])
@@ -66,6 +67,7 @@ for filepath in glob.glob(os.path.join(current_dir, "best*.txt")):
                 item_details = (
                     f"{best_tradeup}\n"
                     f"{best_individual}\n"
+                    f"{best_items_line}"
                     f"price_deviation: {price_deviation}\n"
                     f"float_deviation: {float_deviation}\n"
                     f"Profitability: {tradeup_profitability}\n"  # using tradeup profitabilty as currently only 1 tradeup per individual
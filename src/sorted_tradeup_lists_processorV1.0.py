@@ -1,4 +1,5 @@
 import csv
+import math
 import orjson
 from collections import defaultdict
 from tqdm import tqdm
@@ -10,12 +11,14 @@ def parse_tradeup_file(filename):
         for line in f:
             if line.startswith("Best Tradeup:"):
                 current_tradeup = line.strip()
-                tradeups[current_tradeup] = {"float_values": []}
+                tradeups[current_tradeup] = {"float_values": [], "source_rows": None}
             elif line.startswith("Best Individual:"):
                 best_individual = eval(line.split(": ")[1])
                 mid = len(best_individual) // 2
                 tradeups[current_tradeup]["float_values"] = best_individual[mid:]
                 tradeups[current_tradeup]["prices"] = best_individual[:mid]
+            elif line.startswith("Best Items:"):
+                tradeups[current_tradeup]["source_rows"] = eval(line.split(": ")[1])
             elif line.startswith("price_deviation:"):
                 tradeups[current_tradeup]["price_deviation"] = float(line.split(": ")[1])
     return tradeups
@@ -25,16 +28,33 @@ def calculate_modified_price(prices, price_deviation):
     modified_price = (total_price / len(prices)) - price_deviation
     return modified_price
 
+def get_source_row_items(rows, source_rows, float_values, float_to_items):
+    # The listings at the CSV rows the GA recorded. A row is only used if it still holds the listing's float,
+    # otherwise the CSV changed since processed_items.json was made and the float is matched instead
+    items = []
+    for source_row, float_value in zip(source_rows, float_values):
+        if source_row < len(rows) and math.isclose(float(rows[source_row][4]), float_value, rel_tol=1e-6):
+            items.append(rows[source_row])
+        else:
+            print(f"Row {source_row} of the CSV does not hold the listing with float {float_value}, matching the float instead")
+            items.extend(float_to_items.get(float_value, []))
+    return items
+
 def process_tradeups(tradeups, csv_filename):
     result_json = defaultdict(set)
     expanded_json = defaultdict(list)
 
     print("Reading CSV file...")
+    rows = []
     float_to_items = defaultdict(list)
     with open(csv_filename, 'r') as csvfile:
         reader = csv.reader(csvfile)
         next(reader)  # Skip header
         for row in reader:
+            # Blank lines are skipped like pandas does when processed_items_maker numbers the rows
+            if not row:
+                continue
+            rows.append(row)
             float_value = float(row[4])
             float_to_items[float_value].append(row)
 
@@ -43,11 +63,16 @@ def process_tradeups(tradeups, csv_filename):
         modified_price = calculate_modified_price(data["prices"], data["price_deviation"])
         new_key = f"{tradeup}_{modified_price:.2f}"
         
-        for float_value in data["float_values"]:
-            matching_items = float_to_items.get(float_value, [])
-            for item in matching_items:
-                result_json[new_key].add(item[0].replace("_data.json", ""))
-                expanded_json[new_key].append(item)
+        if data["source_rows"] is not None:
+            # The GA records the CSV rows of the selected listings
+            matching_items = get_source_row_items(rows, data["source_rows"], data["float_values"], float_to_items)
+        else:
+            # Older results only carry the floats, match them back to the listings
+            matching_items = [item for float_value in data["float_values"] for item in float_to_items.get(float_value, [])]
+
+        for item in matching_items:
+            result_json[new_key].add(item[0].replace("_data.json", ""))
+            expanded_json[new_key].append(item)
 
 
     return {k: list(v) for k, v in result_json.items()}, dict(expanded_json)
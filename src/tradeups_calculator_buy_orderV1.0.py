@@ -1,102 +1,134 @@
 import polars as pl
-import re
+import numpy as np
 from tqdm import tqdm
 import json
+import os
 from operator import itemgetter
 import concurrent.futures
+import heapq
+import itertools
+import multiprocessing
+import argparse
+from market_price_index import MarketPriceIndex, WEAR_NAMES
 
 STEAM_TAX_THRESHOLD = 1.15
 
+WEAR_RANGES = np.array([[0, 0.07], [0.07, 0.15], [0.15, 0.38], [0.38, 0.45], [0.45, 1]])
+WEAR_BOUNDARIES = WEAR_RANGES[1:, 0]
+
+PROBABILITY_RANGES = np.array([[0, 0.07], [0.08, 0.15], [0.16, 0.38], [0.39, 0.45], [0.46, 1]])
+PROBABILITY_WEIGHTS = np.array([0.03, 0.24, 0.33, 0.24, 0.16])
+
+PROBABILITY_CURVES_FILE = '.temp/probability_curves.json'
+probability_curves = {}
+
+def get_wear_indices(floats):
+    # Index into WEAR_NAMES, -1 where get_wear_category would return None
+    floats = np.asarray(floats)
+    wear_indices = np.searchsorted(WEAR_BOUNDARIES, floats, side='right')
+    return np.where((floats >= 0) & (floats < 1), wear_indices, -1)
+
+def adjust_probability_ranges(start_float, end_float):
+    # Squish the probability ranges onto the skin's [start_float, end_float] float range
+    squish_factor = 1 - ((start_float - 0) + (1 - end_float))
+    range_starts = start_float + PROBABILITY_RANGES[:, 0] * squish_factor
+    range_ends = start_float + PROBABILITY_RANGES[:, 1] * squish_factor
+    return range_starts, range_ends
+
+def get_type_min_floats(range_starts, range_ends):
+    # min_float for each wear type: the type minimum if it falls inside an adjusted range,
+    # otherwise the start of the next adjusted range
+    type_mins = WEAR_RANGES[:, 0]
+    ranges_after = range_ends[None, :] > type_mins[:, None]
+    first_range = ranges_after.argmax(axis=1)
+    return np.where(ranges_after.any(axis=1), np.maximum(type_mins, range_starts[first_range]), type_mins)
+
+def calculate_area(range_starts, range_ends, start, end):
+    # Area under the piecewise-constant probability density between start and end (broadcasts)
+    start, end = np.asarray(start, dtype=float), np.asarray(end, dtype=float)
+    overlap = np.minimum(range_ends, end[..., None]) - np.maximum(range_starts, start[..., None])
+    return (np.maximum(overlap, 0) * PROBABILITY_WEIGHTS).sum(axis=-1)
+
+def invert_area(range_starts, range_ends, start, target_area, upper):
+    # Closed-form inverse of calculate_area: the smallest end >= start with
+    # calculate_area(start, end) >= target_area, capped at upper
+    if target_area <= 0:
+        return start
+    remaining_area = target_area
+    for r_start, r_end, weight in zip(range_starts, range_ends, PROBABILITY_WEIGHTS):
+        segment_start = max(r_start, start)
+        if r_end <= segment_start:
+            continue
+        segment_area = (r_end - segment_start) * weight
+        if segment_area >= remaining_area:
+            return min(segment_start + remaining_area / weight, upper)
+        remaining_area -= segment_area
+    return upper
+
+def calculate_type_probabilities(range_starts, range_ends, min_float, max_type_value, target_floats):
+    area_target = calculate_area(range_starts, range_ends, min_float, target_floats)
+    area_full = calculate_area(range_starts, range_ends, min_float, max_type_value)
+    return np.divide(area_target * 2, area_full, out=np.zeros_like(area_target), where=area_full != 0) * 100
+
 def probability_float_function(item_name, start_float, end_float, target_float):
-    types = {
-        'Factory New': [0, 0.07],
-        'Minimal Wear': [0.07, 0.15],
-        'Field-Tested': [0.15, 0.38],
-        'Well-Worn': [0.38, 0.45],
-        'Battle-Scarred': [0.45, 1]
-    }
+    range_starts, range_ends = adjust_probability_ranges(start_float, end_float)
 
     # Determine item_type based on target_float
-    item_type = None
-    for key, value in types.items():
-        if value[0] <= target_float < value[1]:
-            item_type = key
-            break
-
-    prob_dict = {
-        'r1': [[0, 0.07], 0.03],
-        'r2': [[0.08, 0.15], 0.24],
-        'r3': [[0.16, 0.38], 0.33],
-        'r4': [[0.39, 0.45], 0.24],
-        'r5': [[0.46, 1], 0.16]
-    }
+    type_index = int(get_wear_indices(target_float))
+    min_float = float(get_type_min_floats(range_starts, range_ends)[type_index])
+    max_type_value = float(WEAR_RANGES[type_index, 1])
 
-    squish_factor = 1 - ((start_float - 0) + (1 - end_float))
+    # max_float is where the area from target_float to max_float equals the area from min_float to target_float
+    target_area = float(calculate_area(range_starts, range_ends, min_float, target_float))
+    max_float = float(invert_area(range_starts, range_ends, target_float, target_area, max_type_value))
 
-    # Adjust the probability ranges by multiplying the float ranges by the squish_factor
-    adjusted_prob_dict = {}
-    for key, value in prob_dict.items():
-        adjusted_prob_dict[key] = [[start_float + v * squish_factor for v in value[0]], value[1]]
-
-    # Determine the minimum float value based on the item type and adjusted number line
-    min_type_value = types[item_type][0]
-    min_float = None
-    max_type_value = types[item_type][1]
-    number_line = sorted([item for sublist in [value[0] for value in adjusted_prob_dict.values()] for item in sublist])
-
-    for i in range(0, len(number_line), 2):
-        if number_line[i] <= min_type_value < number_line[i + 1]:
-            min_float = min_type_value
-            break
-        elif number_line[i] > min_type_value:
-            min_float = number_line[i]
-            break
-
-    if min_float is None:
-        min_float = types[item_type][0]
-
-    # Find the max_float where the area from min_float to target_float is equal to the area from target_float to max_float
-    def calculate_area(start, end):
-        area = 0
-        for key, value in adjusted_prob_dict.items():
-            r_start, r_end = value[0]
-            if r_start < end and r_end > start:
-                overlap_start = max(r_start, start)
-                overlap_end = min(r_end, end)
-                if overlap_start < overlap_end:
-                    area += (overlap_end - overlap_start) * value[1]
-        return area
-
-    target_area = calculate_area(min_float, target_float)
-
-    # Binary search for max_float
-    def binary_search_max_float(target_area, target_float):
-        low = target_float
-        high = types[item_type][1]
-        max_float = target_float
-
-        while high - low > 1e-14:
-            mid = (low + high) / 2
-            area_mid = calculate_area(target_float, mid)
-            if area_mid < target_area:
-                low = mid
-            else:
-                high = mid
-            max_float = mid
-
-        return max_float
-
-    max_float = binary_search_max_float(target_area, target_float)
-
-    # Calculate the areas for probability calculation
-    area_target = calculate_area(min_float, target_float)
-    area_full = calculate_area(min_float, max_type_value)
-
-    # Calculate the probability as a percentage
-    probability_percentage = (area_target * 2 / area_full) * 100 if area_full != 0 else 0
+    probability_percentage = float(calculate_type_probabilities(range_starts, range_ends, min_float, max_type_value, target_float))
 
     return min_float, max_float, probability_percentage
 
+def build_probability_curve(start_float, end_float):
+    # Within a wear type the probability is piecewise linear in the target float, so the whole
+    # curve is stored as (knots, values) per wear type and evaluated with linear interpolation
+    range_starts, range_ends = adjust_probability_ranges(start_float, end_float)
+    type_min_floats = get_type_min_floats(range_starts, range_ends)
+
+    curve = []
+    for (type_min, type_max), min_float in zip(WEAR_RANGES, type_min_floats):
+        knots = {type_min, type_max, min_float}
+        knots.update(v for v in np.concatenate([range_starts, range_ends]) if type_min < v < type_max)
+        knots = np.array(sorted(float(k) for k in knots if type_min <= k <= type_max))
+        values = calculate_type_probabilities(range_starts, range_ends, min_float, type_max, knots)
+        curve.append([knots.tolist(), values.tolist()])
+    return curve
+
+def get_probability_curve(start_float, end_float):
+    key = f"{start_float}_{end_float}"
+    if key not in probability_curves:
+        probability_curves[key] = build_probability_curve(start_float, end_float)
+    return probability_curves[key]
+
+def load_probability_curves(file_path=PROBABILITY_CURVES_FILE):
+    try:
+        with open(file_path, 'r') as f:
+            probability_curves.update(json.load(f))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+def save_probability_curves(file_path=PROBABILITY_CURVES_FILE):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w') as f:
+        json.dump(probability_curves, f)
+
+def probability_percentages(start_float, end_float, target_floats):
+    # Vectorized probability_float_function(...)[2] over an array of target floats
+    target_floats = np.asarray(target_floats, dtype=float)
+    type_indices = get_wear_indices(target_floats)
+    probability_percentage = np.zeros_like(target_floats)
+    for type_index, (knots, values) in enumerate(get_probability_curve(start_float, end_float)):
+        in_type = type_indices == type_index
+        probability_percentage[in_type] = np.interp(target_floats[in_type], knots, values)
+    return probability_percentage
+
 # Optimized helper functions
 def calculate_output_float(avg_float, min_float, max_float):
     return (max_float - min_float) * avg_float + min_float
@@ -112,133 +144,325 @@ def get_wear_category(output_float):
     return next((wear for wear, (min_float, max_float) in wears.items() 
                  if min_float <= output_float < max_float), None)
 
-def find_best_item(input_prices):
-    def calculate_cost(input_price, probability_percentage):
-        probability_percentage = min(probability_percentage, 100)
-        probability_value = probability_percentage / 100
-        return float('inf') if probability_percentage == 0 else \
-                input_price * ((1 / probability_value) - (((1 / probability_value) - 1) * (1/STEAM_TAX_THRESHOLD))) #input_price
-
-                
-    costs = [calculate_cost(item[4], item[5]) for item in input_prices]
-    for item, cost in zip(input_prices, costs):
-        item.append(cost)
+# Vectorized sweep engine: every avg_float of the grid is evaluated at once as a
+# (grid, skins) matrix instead of one Python iteration per float value.
+FLOAT_GRID = np.arange(1, 10001) / 10000
+
+def calculate_costs(input_prices, probability_percentages):
+    probability_values = np.minimum(probability_percentages, 100) / 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        costs = input_prices * ((1 / probability_values) - (((1 / probability_values) - 1) * (1/STEAM_TAX_THRESHOLD)))
+    return np.where(probability_values == 0, np.inf, costs)
+
+def find_best_items(input_prices, costs):
+    # Picks the cheapest item by cost for every row, unless that is also the cheapest item by
+    # listing price, in which case the runner-up by cost is used.
+    # Returns the chosen skin index per row, -1 where fewer than two inputs have a price.
+    listed = ~np.isnan(input_prices)
+    best_indices = np.full(input_prices.shape[0], -1)
+    rows = np.flatnonzero(listed.sum(axis=1) >= 2)
+    if rows.size == 0:
+        return best_indices
+
+    cheapest_by_price = np.nanargmin(input_prices[rows], axis=1)
+    candidates = listed[rows].copy()
+    candidates[np.arange(rows.size), cheapest_by_price] = False
+    best_indices[rows] = np.nanargmin(np.where(candidates, costs[rows], np.nan), axis=1)
+    return best_indices
+
+def evaluate_inputs(avg_floats, input_skins, price_index):
+    # Input prices, probabilities and costs of every (avg_float, input skin) and the chosen input per avg_float
+    input_wear_indices = np.repeat(get_wear_indices(avg_floats)[:, None], len(input_skins), axis=1)
+    input_prices = price_index.lookup_batch(input_skins['Weapon_Skin'].to_list(), input_wear_indices)
+    probabilities = np.column_stack([
+        probability_percentages(row['start_float'], row['end_float'], avg_floats)
+        for row in input_skins.iter_rows(named=True)
+    ])
+    costs = calculate_costs(input_prices, probabilities)
+    return input_prices, probabilities, costs, find_best_items(input_prices, costs)
+
+def evaluate_float_grid(avg_floats, input_skins, output_skins, price_index):
+    # Evaluates every (avg_float, input skin, output skin) combination of one rarity pair at once
+    output_floats = calculate_output_float(avg_floats[:, None], output_skins['start_float'].to_numpy(), output_skins['end_float'].to_numpy())
+    output_wear_indices = get_wear_indices(output_floats)
+    output_prices = price_index.lookup_batch(output_skins['Weapon_Skin'].to_list(), output_wear_indices)
+    valid_outputs = (~np.isnan(output_prices)).sum(axis=1)
+    with np.errstate(invalid='ignore'):
+        avg_output_prices = np.nansum(output_prices, axis=1) / valid_outputs
+
+    input_prices, probabilities, costs, best_indices = evaluate_inputs(avg_floats, input_skins, price_index)
+
+    evaluated = (valid_outputs > 0) & (best_indices >= 0)
+    rows = np.arange(len(avg_floats))
+    chosen = np.clip(best_indices, 0, None)
+
+    total_input_costs = 10 * costs[rows, chosen] * 0.98
+    total_input_prices = 10 * input_prices[rows, chosen] * 0.98
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profitabilities = avg_output_prices / total_input_costs
+    return {
+        'avg_floats': avg_floats,
+        'evaluated': evaluated,
+        'profitable': evaluated & (profitabilities >= STEAM_TAX_THRESHOLD),
+        'avg_output_prices': avg_output_prices,
+        'output_wear_indices': output_wear_indices,
+        'output_prices': output_prices,
+        'best_indices': best_indices,
+        'probabilities': probabilities[rows, chosen],
+        'total_input_costs': total_input_costs,
+        'total_input_prices': total_input_prices,
+        'profitabilities': profitabilities,
+    }
 
-    sorted_by_price = sorted(input_prices, key=lambda x: x[4])
-    sorted_by_cost = sorted(input_prices, key=lambda x: x[-1])
-    
-    return sorted_by_cost[1] if sorted_by_cost[0] == sorted_by_price[0] else sorted_by_cost[0]
+def get_breakpoint_intervals(output_skins, best_indices):
+    # Splits FLOAT_GRID into index intervals over which no output skin and no input changes wear,
+    # i.e. every price in the tradeup is constant, and the chosen input (best_indices over FLOAT_GRID)
+    # stays the same. Wear breakpoints are computed analytically and then snapped to the grid points
+    # where the wear categories actually change.
+    start_floats = output_skins['start_float'].to_numpy()
+    end_floats = output_skins['end_float'].to_numpy()
+    boundaries = np.append(WEAR_BOUNDARIES, 1)
+
+    output_breakpoints = (boundaries[None, :] - start_floats[:, None]) / (end_floats - start_floats)[:, None]
+    breakpoints = np.concatenate([output_breakpoints.ravel(), boundaries])
+    candidates = np.searchsorted(FLOAT_GRID, breakpoints[(breakpoints > 0) & (breakpoints <= 1)])
+    candidates = np.unique(np.concatenate([candidates - 1, candidates, candidates + 1]))
+    candidates = candidates[(candidates >= 1) & (candidates < len(FLOAT_GRID))]
+
+    def wear_signature(indices):
+        avg_floats = FLOAT_GRID[indices]
+        output_wears = get_wear_indices(calculate_output_float(avg_floats[:, None], start_floats, end_floats))
+        return np.column_stack([output_wears, get_wear_indices(avg_floats)])
+
+    wear_changes = candidates[(wear_signature(candidates) != wear_signature(candidates - 1)).any(axis=1)]
+
+    # The cheapest input by cost can also switch inside a wear interval as the input probabilities grow
+    input_changes = np.flatnonzero(best_indices[1:] != best_indices[:-1]) + 1
+    changes = np.union1d(wear_changes, input_changes)
+    interval_starts = np.concatenate([[0], changes])
+    interval_ends = np.concatenate([changes - 1, [len(FLOAT_GRID) - 1]])
+    return interval_starts, interval_ends
+
+def sweep_breakpoints(input_skins, output_skins, price_index):
+    # Within a breakpoint interval all prices and the chosen input are constant and the input's
+    # probability only grows with avg_float, so profitability is non-decreasing: the interval's last
+    # grid point is its best tradeup. Only those are fully evaluated, plus a vectorized binary search
+    # for the first profitable grid point of each profitable interval. The chosen input is found on
+    # the whole grid first, which only needs the input prices and probabilities.
+    best_indices = evaluate_inputs(FLOAT_GRID, input_skins, price_index)[3]
+    interval_starts, interval_ends = get_breakpoint_intervals(output_skins, best_indices)
+
+    def profitable_at(indices):
+        return evaluate_float_grid(FLOAT_GRID[indices], input_skins, output_skins, price_index)['profitable']
+
+    sweep = evaluate_float_grid(FLOAT_GRID[interval_ends], input_skins, output_skins, price_index)
+    low = interval_starts[sweep['profitable']]
+    high = interval_ends[sweep['profitable']]
+    while (low < high).any():
+        searching = low < high
+        mid = (low[searching] + high[searching]) // 2
+        mid_profitable = profitable_at(mid)
+        high[searching] = np.where(mid_profitable, mid, high[searching])
+        low[searching] = np.where(mid_profitable, low[searching], mid + 1)
+
+    float_ranges = np.full((len(interval_ends), 2), np.nan)
+    float_ranges[sweep['profitable']] = np.column_stack([FLOAT_GRID[low], FLOAT_GRID[interval_ends[sweep['profitable']]]])
+    sweep['float_ranges'] = float_ranges
+    return sweep
+
+def sweep_adaptive(input_skins, output_skins, price_index, resolution, coarse_step, margin):
+    # Evaluates a coarse avg_float grid first and only refines the coarse cells where an endpoint
+    # comes within margin of STEAM_TAX_THRESHOLD, down to the fine resolution
+    num_fine = round(1 / resolution)
+    fine_grid = np.arange(1, num_fine + 1) / num_fine
+    stride = max(round(coarse_step / resolution), 1)
+    coarse_indices = np.unique(np.concatenate([[0], np.arange(stride - 1, num_fine, stride), [num_fine - 1]]))
+
+    coarse_sweep = evaluate_float_grid(fine_grid[coarse_indices], input_skins, output_skins, price_index)
+    near_profitable = coarse_sweep['evaluated'] & (coarse_sweep['profitabilities'] >= STEAM_TAX_THRESHOLD * (1 - margin))
+    refine_cells = near_profitable[:-1] | near_profitable[1:]
+
+    refined_indices = [np.arange(low + 1, high) for low, high in zip(coarse_indices[:-1][refine_cells], coarse_indices[1:][refine_cells])]
+    indices = np.unique(np.concatenate([coarse_indices, *refined_indices]))
+    return evaluate_float_grid(fine_grid[indices], input_skins, output_skins, price_index)
+
+def build_tradeup_record(case, input_rarity, output_rarity, input_names, output_names, sweep, i):
+    avg_float = float(sweep['avg_floats'][i])
+    outputs_details = {
+        weapon_name: [WEAR_NAMES[wear_index], float(output_price)]
+        for weapon_name, wear_index, output_price in zip(output_names, sweep['output_wear_indices'][i], sweep['output_prices'][i])
+        if not np.isnan(output_price)
+    }
+    theoretical_max_profitability = sweep['avg_output_prices'][i] / sweep['total_input_prices'][i]
+    tradeup = {
+        'Case': case,
+        'Input Skin': input_names[sweep['best_indices'][i]],
+        'Input Rarity': input_rarity,
+        'Inputs Wear': get_wear_category(avg_float),
+        'Output Rarity': output_rarity,
+        'Average Float': avg_float,
+        'Avg Output Price': float(sweep['avg_output_prices'][i]),
+        'Total Input Cost': float(sweep['total_input_costs'][i]),
+        'Real Profitablity': float(sweep['profitabilities'][i] / STEAM_TAX_THRESHOLD),
+        'Theoretical Max Profitablity': float(theoretical_max_profitability / STEAM_TAX_THRESHOLD),
+        'outputs_details': outputs_details
+    }
+    if 'float_ranges' in sweep:
+        # avg_float range over which this tradeup (same input skin, input wear and outputs) stays profitable
+        tradeup['Float Range'] = sweep['float_ranges'][i].tolist()
+    return tradeup
 
-def process_case(case, skins_df, market_data_df):
+def process_case(case, skins_df, price_index, sweep_mode='breakpoints', resolution=1e-4, coarse_step=0.01, margin=0.2):
     rarities = ['Mil-Spec', 'Restricted', 'Classified', 'Covert']
     profitable_tradeups = []
 
+    if not probability_curves:
+        load_probability_curves()
+
     for rarity_index in range(len(rarities) - 1):
         input_rarity = rarities[rarity_index]
         output_rarity = rarities[rarity_index + 1]
         
         input_skins = skins_df.filter((pl.col('Case') == case) & (pl.col('Rarity') == input_rarity))
         output_skins = skins_df.filter((pl.col('Case') == case) & (pl.col('Rarity') == output_rarity))
+        if input_skins.is_empty() or output_skins.is_empty():
+            continue
 
-        for avg_float in [i / 10000 for i in range(1, 10001)]:
-            output_floats = {row['Weapon_Skin']: calculate_output_float(avg_float, row['start_float'], row['end_float']) 
-                             for row in output_skins.iter_rows(named=True)}
-            
-            outputs_details = {}
-            total_output_price = 0
-            valid_outputs = 0
-
-            for weapon_name, output_float in output_floats.items():
-                wear_category = get_wear_category(output_float)
-                if wear_category:
-                    market_row = market_data_df.filter(
-                        pl.col('hash_name').str.starts_with(weapon_name) & 
-                        pl.col('hash_name').str.contains(re.escape(f"({wear_category})"))
-                    )
-                    if not market_row.is_empty():
-                        output_price = market_row['sell_price'].item()
-                        total_output_price += output_price
-                        outputs_details[weapon_name] = [wear_category, output_price]
-                        valid_outputs += 1
-            
-            if valid_outputs > 0:
-                avg_output_price = total_output_price / valid_outputs
-
-                input_prices = []
-                for row in input_skins.iter_rows(named=True):
-                    input_skin_name = row['Weapon_Skin']
-                    wear_category = get_wear_category(avg_float)
-                    if wear_category:
-                        market_row = market_data_df.filter(
-                            pl.col('hash_name').str.starts_with(row["Weapon_Skin"]) & 
-                            pl.col('hash_name').str.contains(re.escape(f"({wear_category})"))
-                        )
-
-                        if not market_row.is_empty():
-                            input_price = market_row['sell_price'].item()
-                            _, _, probability_percentage = probability_float_function(
-                                input_skin_name, row['start_float'], row['end_float'], avg_float)
-                            input_prices.append([row['Case'], input_skin_name, row['Rarity'], 
-                                                 avg_float, input_price, probability_percentage])
-
-                if input_prices:
-                    best_item = find_best_item(input_prices)
-                    input_price = best_item[4]
-
-                    total_input_cost = 10 * best_item[-1] * 0.98
-                    profitability = avg_output_price / total_input_cost
-
-                    total_input_price = 10 * input_price * 0.98
-
-                    if total_input_price > total_input_cost:
-                        print(f"ratio: = {total_input_price / total_input_cost}, probability = {best_item[5]}")
-
-                    theoretical_max_profitability = avg_output_price / total_input_price
-                    inputs_wear_category = get_wear_category(best_item[3])
-                    if profitability >= STEAM_TAX_THRESHOLD:
-                        profitable_tradeups.append({
-                            'Case': best_item[0],
-                            'Input Skin': best_item[1],
-                            'Input Rarity': best_item[2],
-                            'Inputs Wear': inputs_wear_category,
-                            'Output Rarity': output_rarity,
-                            'Average Float': best_item[3],
-                            'Avg Output Price': avg_output_price,
-                            'Total Input Cost': total_input_cost,
-                            'Real Profitablity': profitability / STEAM_TAX_THRESHOLD,
-                            'Theoretical Max Profitablity': theoretical_max_profitability / STEAM_TAX_THRESHOLD,
-                            'outputs_details': outputs_details
-                        })
+        input_names = input_skins['Weapon_Skin'].to_list()
+        output_names = output_skins['Weapon_Skin'].to_list()
 
-    return profitable_tradeups
+        if sweep_mode == 'breakpoints':
+            sweep = sweep_breakpoints(input_skins, output_skins, price_index)
+        elif sweep_mode == 'adaptive':
+            sweep = sweep_adaptive(input_skins, output_skins, price_index, resolution, coarse_step, margin)
+        else:
+            sweep = evaluate_float_grid(FLOAT_GRID, input_skins, output_skins, price_index)
+            total_input_costs, total_input_prices = sweep['total_input_costs'], sweep['total_input_prices']
+            for i in np.flatnonzero(sweep['evaluated'] & (total_input_prices > total_input_costs)):
+                print(f"ratio: = {total_input_prices[i] / total_input_costs[i]}, probability = {sweep['probabilities'][i]}")
 
-def main():
-    # Read the CSV files
-    skins_df = pl.read_csv('skins.csv')
-    market_data_df = pl.read_csv('searched_market_data.csv')
+        for i in np.flatnonzero(sweep['profitable']):
+            profitable_tradeups.append(build_tradeup_record(case, input_rarity, output_rarity, input_names, output_names, sweep, i))
 
-    cases = skins_df['Case'].unique().to_list()
+    return profitable_tradeups
 
-    # Process cases in parallel
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-        futures = [executor.submit(process_case, case, skins_df, market_data_df) for case in cases]
-        all_profitable_tradeups = []
-        for future in tqdm(concurrent.futures.as_completed(futures), total=len(cases), desc="Processing Cases"):
-            all_profitable_tradeups.extend(future.result())
+SKINS_IPC_FILE = '.temp/skins.arrow'
+MARKET_DATA_IPC_FILE = '.temp/searched_market_data.arrow'
+
+# Per-worker tables, mapped once by init_worker so tasks only carry the case name
+worker_skins_df = None
+worker_price_index = None
+
+def update_ipc_snapshot(csv_file, ipc_file):
+    # Rewrites the uncompressed Arrow IPC snapshot of csv_file only when the CSV is newer than it
+    if not os.path.exists(ipc_file) or os.path.getmtime(csv_file) > os.path.getmtime(ipc_file):
+        os.makedirs(os.path.dirname(ipc_file), exist_ok=True)
+        pl.read_csv(csv_file).write_ipc(ipc_file, compression='uncompressed')
+
+def init_worker(skins_file, market_data_file):
+    # Uncompressed IPC files are memory-mapped by read_ipc rather than copied into each worker
+    global worker_skins_df, worker_price_index
+    worker_skins_df = pl.read_ipc(skins_file)
+    market_data_df = pl.read_ipc(market_data_file)
+    worker_price_index = MarketPriceIndex.from_rows(market_data_df.select(['hash_name', 'sell_price']).iter_rows())
+    load_probability_curves()
+
+def process_case_task(case, sweep_mode, sweep_options):
+    return process_case(case, worker_skins_df, worker_price_index, sweep_mode, **sweep_options)
+
+def custom_json_dump(obj, file):
+    json_str = json.dumps(obj, ensure_ascii=False)
+    file.write(json_str + '\n')
+
+def write_jsonl(tradeups, file_path):
+    with open(file_path, 'w', encoding='utf-8') as jsonl_file:
+        for tradeup in tradeups:
+            custom_json_dump(tradeup, jsonl_file)
 
-    # Sort the tradeups
-    sorted_tradeups = sorted(all_profitable_tradeups, key=itemgetter('Real Profitablity'), reverse=True)
+def read_jsonl(file_path):
+    with open(file_path, 'r', encoding='utf-8') as jsonl_file:
+        for line in jsonl_file:
+            yield json.loads(line)
+
+def merge_sorted_runs(run_files, output_file):
+    # External merge of runs that are each sorted by 'Real Profitablity' (descending)
+    runs = [read_jsonl(run_file) for run_file in run_files]
+    write_jsonl(heapq.merge(*runs, key=itemgetter('Real Profitablity'), reverse=True), output_file)
+    for run_file in run_files:
+        os.remove(run_file)
+
+def push_top_k(top_k_heap, tradeups, top_k, sequence):
+    # Bounded min-heap of the best top_k tradeups; among equal profitabilities the earliest
+    # result is kept, matching the stable sort of the unbounded path
+    for tradeup in tradeups:
+        entry = (tradeup['Real Profitablity'], -next(sequence), tradeup)
+        if len(top_k_heap) < top_k:
+            heapq.heappush(top_k_heap, entry)
+        elif entry[:2] > top_k_heap[0][:2]:
+            heapq.heapreplace(top_k_heap, entry)
+
+def positive_int(value):
+    # argparse type for counts that must be at least 1
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def main(sweep_mode, sweep_options, top_k=None):
+    # Snapshot the CSV files as uncompressed Arrow IPC so every worker can memory-map them. The CSVs are
+    # only parsed again when they changed since the last run
+    update_ipc_snapshot('skins.csv', SKINS_IPC_FILE)
+    update_ipc_snapshot('searched_market_data.csv', MARKET_DATA_IPC_FILE)
+    skins_df = pl.read_ipc(SKINS_IPC_FILE)
 
-    # Save to JSONL file
-    def custom_json_dump(obj, file):
-        json_str = json.dumps(obj, ensure_ascii=False)
-        file.write(json_str + '\n')
+    cases = skins_df['Case'].unique().to_list()
 
-    with open('profitable_tradeups.jsonl', 'w', encoding='utf-8') as jsonl_file:
-        for tradeup in sorted_tradeups:
-            custom_json_dump(tradeup, jsonl_file)
+    # Precompute the probability curve of every skin float range and cache it for the workers
+    load_probability_curves()
+    for start_float, end_float in skins_df.select(['start_float', 'end_float']).unique().iter_rows():
+        get_probability_curve(start_float, end_float)
+    save_probability_curves()
+
+    # Process cases in parallel. Workers are spawned rather than forked as polars' thread pool
+    # does not survive a fork
+    with concurrent.futures.ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'), initializer=init_worker,
+                                                initargs=(SKINS_IPC_FILE, MARKET_DATA_IPC_FILE)) as executor:
+        futures = [executor.submit(process_case_task, case, sweep_mode, sweep_options) for case in cases]
+
+        # Results are streamed out as futures complete: either into a bounded top-k heap or as
+        # sorted runs on disk that are merged at the end, so the full list is never held in memory
+        top_k_heap = []
+        sequence = itertools.count()
+        run_files = []
+        for future in tqdm(concurrent.futures.as_completed(futures), total=len(cases), desc="Processing Cases"):
+            tradeups = future.result()
+            if top_k is not None:
+                push_top_k(top_k_heap, tradeups, top_k, sequence)
+            elif tradeups:
+                run_file = f'.temp/profitable_tradeups_run_{len(run_files)}.jsonl'
+                write_jsonl(sorted(tradeups, key=itemgetter('Real Profitablity'), reverse=True), run_file)
+                run_files.append(run_file)
+
+    # Save to JSONL file sorted by 'Real Profitablity'
+    if top_k is not None:
+        write_jsonl([tradeup for _, _, tradeup in sorted(top_k_heap, key=itemgetter(0, 1), reverse=True)], 'profitable_tradeups.jsonl')
+    else:
+        merge_sorted_runs(run_files, 'profitable_tradeups.jsonl')
 
     print("Data has been saved to profitable_tradeups.jsonl")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Find profitable single-collection tradeups.')
+    parser.add_argument('--sweep', choices=['breakpoints', 'grid', 'adaptive'], default='breakpoints',
+                        help='breakpoints: one row per constant-price avg_float interval, grid: every 1e-4 avg_float step, '
+                             'adaptive: coarse grid refined only near profitable regions')
+    parser.add_argument('--resolution', type=float, default=1e-4, help='finest avg_float step of the adaptive sweep')
+    parser.add_argument('--coarse-step', type=float, default=0.01, help='initial avg_float step of the adaptive sweep')
+    parser.add_argument('--margin', type=float, default=0.2,
+                        help='adaptive sweep refines coarse cells whose profitability is within this fraction of STEAM_TAX_THRESHOLD')
+    parser.add_argument('--top-k', type=positive_int, default=None,
+                        help='only keep the N most profitable tradeups in profitable_tradeups.jsonl')
+    args = parser.parse_args()
+
+    sweep_options = {'resolution': args.resolution, 'coarse_step': args.coarse_step, 'margin': args.margin}
+    main(args.sweep, sweep_options, args.top_k)
\ No newline at end of file
@@ -0,0 +1,16 @@
+import importlib.util
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+def load_script(filename):
+    # The pipeline scripts have dots in their names, so they are loaded by path instead of imported
+    module_name = os.path.splitext(filename)[0].replace('.', '_')
+    if module_name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(SRC_DIR, filename))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[module_name]
@@ -0,0 +1,25 @@
+import numpy as np
+
+from conftest import load_script
+
+generator = load_script('combos_generatorV1.0.py')
+
+
+def get_outcomes(names, wears, prices):
+    return {'names': names, 'wears': wears, 'prices': np.array(prices, dtype=float)}
+
+
+def test_shared_outputs_add_up_their_weights():
+    # Both cases can drop 'AK-47 | Shared (Field-Tested)', listed once per input in the expanded model
+    original_outcomes = get_outcomes(['AK-47 | Shared', 'M4A4 | Only A'], ['Field-Tested', 'Field-Tested'], [10.0, 20.0])
+    other_outcomes = get_outcomes(['AK-47 | Shared'], ['Field-Tested'], [10.0])
+    original_tradeup = {'Case': 'A Case', 'Average Float': 0.2}
+
+    tradeup = generator.build_combination(original_tradeup, [('A Case', 8), ('B Case', 2)], [original_outcomes, other_outcomes],
+                                          {'B Case': 'Filler'}, 50.0, 12.0)
+
+    # 8 inputs of A Case give 16 outcomes and 2 inputs of B Case give 2 more, 8 + 2 of them are the shared skin
+    assert tradeup['outputs_details'] == {
+        'AK-47 | Shared (Field-Tested)': [10.0, f"{10 / 18:.2%}"],
+        'M4A4 | Only A (Field-Tested)': [20.0, f"{8 / 18:.2%}"],
+    }
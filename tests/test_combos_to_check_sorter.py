@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from conftest import load_script
+
+sorter = load_script('combos_to_check_sorter_V1.0.py')
+
+# (output prices, total input cost) of walks with a clearly positive or negative drift
+FIRST_PASSAGE_ENTRIES = [
+    ([95, 100, 105, 115, 120], 90),
+    ([80, 100, 110, 125, 140], 100),
+    ([50, 100, 100, 100, 250], 100),
+    ([30, 60, 90, 200], 100),
+    ([10, 40, 130, 140], 100),
+]
+
+
+def simulate(output_prices_list, total_input_cost, num_runs=20000, max_steps=1000, entry_seed=12345):
+    # (mean steps of the walks that hit, hit probability) from the CPU simulator
+    num_steps_to_profit = sorter.CpuSimulator().simulate_batch([output_prices_list], [total_input_cost], [entry_seed], 0, num_runs,
+                                                               max_steps, sorter.profit_threshold)[0]
+    hit = num_steps_to_profit <= max_steps
+    return num_steps_to_profit[hit].mean(), hit.mean()
+
+
+@pytest.mark.parametrize('output_prices_list, total_input_cost', FIRST_PASSAGE_ENTRIES)
+def test_analytic_first_passage_matches_simulation(output_prices_list, total_input_cost):
+    num_steps_needed, hit_probability = sorter.estimate_first_passage(output_prices_list, total_input_cost, sorter.profit_threshold, 0.05)
+    simulated_steps, simulated_hit_probability = simulate(output_prices_list, total_input_cost)
+    assert num_steps_needed == pytest.approx(simulated_steps, rel=0.05)
+    assert hit_probability == pytest.approx(simulated_hit_probability, abs=0.01)
+
+
+def test_analytic_first_passage_leaves_worthless_outcomes_to_the_simulation():
+    assert sorter.estimate_first_passage([0, 100, 120, 140], 100, sorter.profit_threshold, 0.05) is None
+
+
+@pytest.mark.parametrize('output_prices_list, total_input_cost', FIRST_PASSAGE_ENTRIES)
+def test_fft_first_passage_matches_simulation(output_prices_list, total_input_cost):
+    # The lattice rounds every log step, so the two agree to a few percent rather than exactly
+    num_steps_needed, hit_probability = sorter.fft_first_passage(output_prices_list, total_input_cost, sorter.profit_threshold, 1000, 20)
+    simulated_steps, simulated_hit_probability = simulate(output_prices_list, total_input_cost)
+    assert num_steps_needed == pytest.approx(simulated_steps, rel=0.05)
+    assert hit_probability == pytest.approx(simulated_hit_probability, abs=0.01)
+
+
+def test_fft_first_passage_leaves_worthless_outcomes_to_the_simulation():
+    assert sorter.fft_first_passage([0, 100, 120, 140], 100, sorter.profit_threshold, 1000, 20) is None
+    assert sorter.score_entry_without_simulation('fft', 0.05, 1000, 20, [0, 100, 120, 140], 100, 0) is None
+
+
+@pytest.mark.parametrize('profitabilities', [[1.001, 0.5], [1.001, 1.0011]])
+def test_fft_first_passage_leaves_steps_below_the_lattice_to_the_simulation(profitabilities):
+    # Winning steps smaller than half a lattice step round to 0 and would never reach the barrier on the lattice
+    total_input_cost = 10
+    output_prices_list = [profitability * total_input_cost * sorter.STEAM_TAX for profitability in profitabilities]
+    assert sorter.fft_first_passage(output_prices_list, total_input_cost, sorter.profit_threshold, 1000, 20) is None
+    assert sorter.score_entry_without_simulation('fft', 0.05, 1000, 20, output_prices_list, total_input_cost, 0) is None
+
+
+# Entries of one simulated batch: a fast hitter, a slow one, one that rarely hits and one with a worthless outcome
+SIMULATION_ENTRIES = [
+    ([95, 100, 105, 115, 120], 90),
+    ([80, 90, 100, 110, 150], 90),
+    ([10, 40, 130, 140], 100),
+    ([0, 100, 120, 140], 100),
+]
+
+
+def simulate_kernel_reference(output_prices_list, total_input_cost, entry_seed, run, max_steps, profit_threshold):
+    # Line by line port of the simulate_profitability kernel for one (entry, run) thread
+    step_profitabilities = sorter.get_step_profitabilities(output_prices_list, total_input_cost)
+    seed = np.uint32(run) ^ np.uint32(entry_seed)
+    cumulative_profitability = np.float32(1.0)
+    with np.errstate(over='ignore'):
+        for step in range(max_steps):
+            seed = sorter.wang_hash(seed)
+            cumulative_profitability *= step_profitabilities[seed % np.uint32(len(step_profitabilities))]
+            if cumulative_profitability >= np.float32(profit_threshold):
+                return step + 1
+    return max_steps + 1
+
+
+def simulate_entries(simulator, entry_seeds, run_start, num_runs, max_steps):
+    output_prices_lists, total_input_costs = zip(*SIMULATION_ENTRIES)
+    return simulator.simulate_batch(list(output_prices_lists), list(total_input_costs), entry_seeds, run_start, num_runs, max_steps,
+                                    sorter.profit_threshold)
+
+
+def test_cpu_simulator_matches_kernel_run_for_run():
+    entry_seeds = [0, 12345, 0xdeadbeef, 7]
+    # A small chunk size and prune interval make chunks, hits and pruning share steps
+    num_steps_to_profit = simulate_entries(sorter.CpuSimulator(chunk_size=100, prune_interval=4), entry_seeds, 50, 60, 200)
+    for (output_prices_list, total_input_cost), entry_seed, entry_steps in zip(SIMULATION_ENTRIES, entry_seeds, num_steps_to_profit):
+        expected = [simulate_kernel_reference(output_prices_list, total_input_cost, entry_seed, 50 + run, 200, sorter.profit_threshold)
+                    for run in range(60)]
+        assert entry_steps.tolist() == expected
+
+
+def test_cuda_simulator_matches_cpu_simulator():
+    pytest.importorskip('pycuda.autoinit')
+    entry_seeds = [0, 12345, 0xdeadbeef, 7]
+    expected = simulate_entries(sorter.CpuSimulator(), entry_seeds, 0, 2000, 1000)
+    np.testing.assert_array_equal(simulate_entries(sorter.CudaSimulator(), entry_seeds, 0, 2000, 1000), expected)
+
+
+def test_entries_get_their_own_streams_unless_shared():
+    keys = [sorter.get_simulation_key(output_prices_list, total_input_cost, 0, False, 0.05, 2000)
+            for output_prices_list, total_input_cost in SIMULATION_ENTRIES]
+    assert len({sorter.get_entry_seed(key, False) for key in keys}) == len(keys)
+    assert {sorter.get_entry_seed(key, True) for key in keys} == {0}
+
+
+class TwoHitsPerRoundSimulator:
+    # Every round, the first two runs of every entry hit at step 5 and the rest never do
+    def simulate_batch(self, output_prices_lists, total_input_costs, entry_seeds, run_start, num_runs, max_steps, profit_threshold):
+        num_steps_to_profit = np.full((len(output_prices_lists), num_runs), max_steps + 1, dtype=np.int32)
+        num_steps_to_profit[:, :2] = 5
+        return num_steps_to_profit
+
+
+def test_rarely_hitting_entries_run_to_the_cap(monkeypatch):
+    # Two identical hits give a zero-width interval, which must not stop the entry before num_runs runs
+    monkeypatch.setattr(sorter, 'num_runs', 8000)
+    [(num_steps_needed, hit_probability)] = sorter.simulate_batch_task(TwoHitsPerRoundSimulator(), [[100, 200]], [100], [0], [0], 0.05, 2000)
+    # Rounds of 2000, 4000 and the remaining 2000 runs
+    assert num_steps_needed == 5
+    assert hit_probability == 6 / 8000
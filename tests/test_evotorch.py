@@ -0,0 +1,95 @@
+import evotorch
+import pytest
+import torch
+
+from conftest import load_script
+
+evotorch_ga = load_script('EVOTORCH_V1.0.py')
+
+# Two collections with 6 + 4 items per individual, their item rows are 0..11 and 100..107
+TRADEUP_DATA = [{'cases': {'A Case': 6, 'B Case': 4}, 'avg_float': 0.2, 'tradeup_price': 10.0},
+                {'A Case': [0, 12], 'B Case': [100, 108]}]
+
+
+@pytest.fixture
+def problem(monkeypatch):
+    monkeypatch.setattr(evotorch_ga, 'NUM_TRADEUPS', 1, raising=False)
+    monkeypatch.setattr(evotorch_ga, 'TOTAL_NUM_ITEMS', 10, raising=False)
+    return evotorch_ga.CustomProblem(solution_length=10, dtype=torch.int64, device='cpu', tradeup_data=TRADEUP_DATA, avg_float=0.2,
+                                     tradeup_price=10.0, item_prices=torch.ones(108), item_floats=torch.ones(108))
+
+
+def random_population(popsize, generator):
+    # Individuals without repeated rows
+    return torch.cat([torch.rand(popsize, 12, generator=generator).argsort(dim=1)[:, :6],
+                      torch.rand(popsize, 8, generator=generator).argsort(dim=1)[:, :4] + 100], dim=1)
+
+
+def test_cross_over_matches_segment_set_unions(problem):
+    # Per pair and segment the children hold the first and last count rows of the union of both parents' rows,
+    # as the set-based crossover did, and pairs whose base union isn't 1.25 times the base count keep the parents
+    generator = torch.Generator().manual_seed(0)
+    parents1 = random_population(500, generator)
+    parents2 = random_population(500, generator)
+    parents2[:100] = parents1[:100]
+    parents2[100:200, :6] = parents1[100:200, :6]
+
+    crossover = evotorch_ga.CustomCrossOver(problem, TRADEUP_DATA)
+    children = crossover._do_cross_over(parents1, parents2).values
+
+    num_crossed = 0
+    for parent1, parent2, child1, child2 in zip(parents1.tolist(), parents2.tolist(), children[0::2].tolist(), children[1::2].tolist()):
+        base_union = set(parent1[:6]) | set(parent2[:6])
+        if len(base_union) <= 6 * 1.25:
+            assert (child1, child2) == (parent1, parent2)
+            continue
+        num_crossed += 1
+        for start, count in [(0, 6), (6, 4)]:
+            union = set(parent1[start:start + count]) | set(parent2[start:start + count])
+            segment1, segment2 = child1[start:start + count], child2[start:start + count]
+            assert len(set(segment1)) == len(set(segment2)) == count
+            assert set(segment1) | set(segment2) == union
+            assert len(set(segment1) & set(segment2)) == 2 * count - len(union)
+
+    assert 0 < num_crossed < 500
+    assert crossover.success_count.item() == num_crossed
+    assert crossover.failure_count.item() == 500 - num_crossed
+
+
+def test_mutation_replaces_a_share_of_every_segment_with_new_rows_of_its_case(problem):
+    # Per individual and segment exactly int(count * mutation_rate) positions get a row of the segment's case range
+    # that the individual didn't hold, so no rows repeat afterwards
+    torch.manual_seed(3)
+    original = random_population(2000, torch.Generator().manual_seed(1))
+    batch = evotorch.SolutionBatch(problem, popsize=2000, empty=True)
+    batch.set_values(original.clone())
+    evotorch_ga.CustomMutation(problem, 0.5, TRADEUP_DATA)(batch)
+
+    for rows, mutated in zip(original.tolist(), batch.values.tolist()):
+        assert len(set(mutated)) == 10
+        for (low, high), start, count in [((0, 12), 0, 6), ((100, 108), 6, 4)]:
+            segment, mutated_segment = rows[start:start + count], mutated[start:start + count]
+            replaced = [new for old, new in zip(segment, mutated_segment) if new != old]
+            assert len(replaced) == int(count * 0.5)
+            assert all(low <= row < high and row not in rows for row in replaced)
+
+
+def test_repair_duplicate_rows_keeps_first_holders_and_removes_repeats():
+    # Rows drawn with replacement repeat in most individuals. After the repair every individual holds distinct rows of
+    # its segments' ranges, the first holder of a row keeps it and individuals without repeats are untouched
+    generator = torch.Generator().manual_seed(2)
+    values = torch.cat([torch.randint(0, 12, (2000, 6), generator=generator), torch.randint(100, 108, (2000, 4), generator=generator)], dim=1)
+    original = values.clone()
+    evotorch_ga.repair_duplicate_rows(values, [('A Case', 0, 6), ('B Case', 6, 4)], TRADEUP_DATA[1])
+
+    num_repaired = 0
+    for rows, repaired in zip(original.tolist(), values.tolist()):
+        assert len(set(repaired)) == 10
+        assert all(0 <= row < 12 for row in repaired[:6]) and all(100 <= row < 108 for row in repaired[6:])
+        seen = set()
+        for row, repaired_row in zip(rows, repaired):
+            if row not in seen:
+                assert repaired_row == row
+            seen.add(row)
+        num_repaired += len(seen) < 10
+    assert num_repaired > 1000
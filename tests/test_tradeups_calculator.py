@@ -0,0 +1,75 @@
+import itertools
+import os
+from operator import itemgetter
+
+import numpy as np
+import polars as pl
+import pytest
+
+from conftest import SRC_DIR, load_script
+
+calculator = load_script('tradeups_calculator_buy_orderV1.0.py')
+
+RARITIES = ['Mil-Spec', 'Restricted', 'Classified', 'Covert']
+
+
+@pytest.fixture(scope='module')
+def market_data():
+    skins_df = pl.read_csv(os.path.join(SRC_DIR, 'skins.csv'))
+    price_index = calculator.MarketPriceIndex.from_csv(os.path.join(SRC_DIR, 'searched_market_data.csv'))
+    return skins_df, price_index
+
+
+def get_rarity_pairs(skins_df):
+    for case in sorted(skins_df['Case'].unique().to_list()):
+        for input_rarity, output_rarity in zip(RARITIES, RARITIES[1:]):
+            input_skins = skins_df.filter((pl.col('Case') == case) & (pl.col('Rarity') == input_rarity))
+            output_skins = skins_df.filter((pl.col('Case') == case) & (pl.col('Rarity') == output_rarity))
+            if not input_skins.is_empty() and not output_skins.is_empty():
+                yield case, input_skins, output_skins
+
+
+def test_breakpoint_sweep_matches_grid_sweep(market_data):
+    # Every profitable grid point lies in exactly one breakpoint row's Float Range, and that row uses
+    # the same input skin and costs as the grid sweep at the interval end
+    skins_df, price_index = market_data
+    for case, input_skins, output_skins in get_rarity_pairs(skins_df):
+        grid = calculator.evaluate_float_grid(calculator.FLOAT_GRID, input_skins, output_skins, price_index)
+        sweep = calculator.sweep_breakpoints(input_skins, output_skins, price_index)
+
+        covered = np.zeros(len(calculator.FLOAT_GRID), dtype=bool)
+        for i in np.flatnonzero(sweep['profitable']):
+            first, last = np.searchsorted(calculator.FLOAT_GRID, sweep['float_ranges'][i])
+            assert not covered[first:last + 1].any()
+            covered[first:last + 1] = True
+            assert (grid['best_indices'][first:last + 1] == sweep['best_indices'][i]).all(), case
+            assert grid['total_input_costs'][last] == sweep['total_input_costs'][i]
+            assert grid['profitabilities'][last] == sweep['profitabilities'][i]
+
+        np.testing.assert_array_equal(covered, grid['profitable'], err_msg=case)
+
+
+def test_top_k_matches_the_head_of_the_merged_runs(tmp_path):
+    # Case results arrive in batches with many tied profitabilities, both within and across batches
+    batches = [
+        [{'Real Profitablity': profitability, 'id': f'{batch}-{i}'} for i, profitability in enumerate(profitabilities)]
+        for batch, profitabilities in enumerate([[1.2, 1.1, 1.2, 1.0], [1.1, 1.2, 1.3], [], [1.0, 1.2, 1.1, 1.1]])
+    ]
+
+    run_files = []
+    for batch in batches:
+        if batch:
+            run_file = str(tmp_path / f'run_{len(run_files)}.jsonl')
+            calculator.write_jsonl(sorted(batch, key=lambda tradeup: tradeup['Real Profitablity'], reverse=True), run_file)
+            run_files.append(run_file)
+    merged_file = str(tmp_path / 'merged.jsonl')
+    calculator.merge_sorted_runs(run_files, merged_file)
+    merged = list(calculator.read_jsonl(merged_file))
+
+    for top_k in [1, 3, 5, 11, 20]:
+        top_k_heap = []
+        sequence = itertools.count()
+        for batch in batches:
+            calculator.push_top_k(top_k_heap, batch, top_k, sequence)
+        top_tradeups = [tradeup for _, _, tradeup in sorted(top_k_heap, key=itemgetter(0, 1), reverse=True)]
+        assert top_tradeups == merged[:top_k]